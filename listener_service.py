@@ -1,34 +1,106 @@
 import asyncio
 import logging
+import os
+import signal
+import socket
 import sys
+from typing import List, Optional
 from src.infrastructure.listener_adapter import GalileoskyListenerAdapter
+from src.infrastructure.control_api import ControlApi
+from src.infrastructure.logging_setup import setup_logging
 from src.config import config
 from prometheus_client import start_http_server
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.DEBUG if config.DEBUG else logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Настройка логирования: вывод в stdout идёт из отдельного потока,
+# цикл событий только кладёт записи в очередь
+log_listener = setup_logging(logging.DEBUG if config.DEBUG else logging.INFO, config.LOG_QUEUE_SIZE)
 
-async def main():
+# Дескриптор слушающего сокета, унаследованный через exec при перезапуске
+LISTEN_FD_ENV = "GALILEOSKY_LISTEN_FD"
+
+
+def inherited_socket() -> Optional[socket.socket]:
+    """Слушающий сокет, переданный предыдущим экземпляром процесса."""
+    fd = os.environ.pop(LISTEN_FD_ENV, None)
+    if not fd:
+        return None
+    sock = socket.socket(fileno=int(fd))
+    sock.set_inheritable(False)
+    logging.info(f"Using inherited listening socket {sock.getsockname()}")
+    return sock
+
+
+async def main() -> Optional[int]:
     """
-    Точка входа для запуска сервиса слушателя
+    Точка входа для запуска сервиса слушателя.
+
+    SIGTERM/SIGINT - плавная остановка: приём подключений прекращается,
+    полученные кадры обрабатываются и подтверждаются, хранилище сбрасывается.
+    SIGHUP - то же, но слушающий сокет остаётся открытым: новые подключения
+    ждут в очереди ядра, а процесс перезапускается через exec с тем же сокетом.
+
+    :return: Дескриптор сокета для перезапуска или None.
     """
+    metrics_server = None
     try:
-        start_http_server(8000)
+        metrics_server, _ = start_http_server(8000)
         logging.info("Prometheus metrics server started on port 8000")
     except Exception as e:
         logging.error(f"Failed to start Prometheus metrics server: {e}")
 
     adapter = GalileoskyListenerAdapter(config.HOST, config.PORT)
-    await adapter.start()
+
+    control_api = None
+    if config.CONTROL_API_PORT:
+        control_api = ControlApi(adapter.commands, config.CONTROL_API_HOST, config.CONTROL_API_PORT, adapter.states)
+        try:
+            await control_api.start()
+        except Exception as e:
+            logging.error(f"Failed to start control API: {e}")
+
+    loop = asyncio.get_running_loop()
+    restart_fd: List[int] = []
+    shutdown_task: Optional[asyncio.Task] = None
+
+    def stop(restart: bool):
+        nonlocal shutdown_task
+        if shutdown_task is not None:
+            logging.info("Shutdown already in progress")
+            return
+        if restart and adapter.server is not None and adapter.server.is_serving():
+            # Копия дескриптора держит сокет открытым после закрытия сервера
+            fd = os.dup(adapter.listen_fd())
+            os.set_inheritable(fd, True)
+            restart_fd.append(fd)
+        logging.info("Restart requested, draining connections" if restart_fd else "Stopping, draining connections")
+        # Ссылка на задачу хранится до конца main(): цикл событий держит только слабую
+        shutdown_task = loop.create_task(adapter.shutdown(config.SHUTDOWN_TIMEOUT))
+
+    loop.add_signal_handler(signal.SIGTERM, stop, False)
+    loop.add_signal_handler(signal.SIGINT, stop, False)
+    loop.add_signal_handler(signal.SIGHUP, stop, True)
+
+    # Возвращается после shutdown(), когда хранилище и экспорт сброшены
+    await adapter.start(inherited_socket())
+    if shutdown_task is not None:
+        # Дожидаемся конца shutdown() и получаем его исключение, если оно было
+        await shutdown_task
+
+    if control_api is not None:
+        await control_api.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
+        metrics_server.server_close()
+    return restart_fd[0] if restart_fd else None
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        pass
+        listen_fd = asyncio.run(main())
+        if listen_fd is not None:
+            logging.info("Re-executing with inherited listening socket")
+    finally:
+        # Дописываем очередь логов: exec и выход отбрасывают поток вывода
+        log_listener.stop()
+        sys.stdout.flush()
+    if listen_fd is not None:
+        os.execve(sys.executable, [sys.executable] + sys.argv, {**os.environ, LISTEN_FD_ENV: str(listen_fd)})
@@ -6,6 +6,75 @@ class Config:
     HOST: str = os.getenv("GALILEOSKY_HOST", "0.0.0.0")
     PORT: int = int(os.getenv("GALILEOSKY_PORT", 12347))
     TIMEOUT: int = int(os.getenv("GALILEOSKY_TIMEOUT", 60))
-    DEBUG: bool = os.getenv("DEBUG", "True").lower() == "true"
+    DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
+
+    # Логирование: сообщения на каждый пакет - не чаще раза в LOG_SAMPLE_INTERVAL секунд
+    # на устройство (0 - без ограничения), сводка мусорных байт - раз в LOG_SUMMARY_INTERVAL,
+    # записи сверх LOG_QUEUE_SIZE в очереди вывода отбрасываются
+    LOG_SAMPLE_INTERVAL: float = float(os.getenv("GALILEOSKY_LOG_SAMPLE_INTERVAL", 10))
+    LOG_SUMMARY_INTERVAL: float = float(os.getenv("GALILEOSKY_LOG_SUMMARY_INTERVAL", 60))
+    LOG_QUEUE_SIZE: int = int(os.getenv("GALILEOSKY_LOG_QUEUE_SIZE", 10000))
+
+    # Схема тегов протокола (пусто - встроенная src/domain/tag_schema.json)
+    TAG_SCHEMA_PATH: str = os.getenv("GALILEOSKY_TAG_SCHEMA", "")
+
+    # Проекция полей: "auto" - только теги, нужные хранилищу и метрикам,
+    # "all" - декодировать все, иначе список полей через запятую
+    FIELD_PROJECTION: str = os.getenv("GALILEOSKY_FIELD_PROJECTION", "auto")
+
+    # Подтеги 0xFE, которые нужно декодировать: имена или номера через запятую,
+    # добавляются к проекции (пусто - все известные схеме, если 0xFE в проекции)
+    EXTENDED_TAGS: str = os.getenv("GALILEOSKY_EXTENDED_TAGS", "")
+
+    # Исходящие команды терминалам и локальный HTTP API (порт 0 - API выключен)
+    CONTROL_API_HOST: str = os.getenv("GALILEOSKY_CONTROL_API_HOST", "127.0.0.1")
+    CONTROL_API_PORT: int = int(os.getenv("GALILEOSKY_CONTROL_API_PORT", 8001))
+    COMMAND_BATCH_SIZE: int = int(os.getenv("GALILEOSKY_COMMAND_BATCH_SIZE", 8))
+    COMMAND_TIMEOUT: int = int(os.getenv("GALILEOSKY_COMMAND_TIMEOUT", 30))
+
+    # Подавление дубликатов архивных записей (окно 0 - выключено)
+    DEDUP_WINDOW: int = int(os.getenv("GALILEOSKY_DEDUP_WINDOW", 4096))
+    DEDUP_MAX_DEVICES: int = int(os.getenv("GALILEOSKY_DEDUP_MAX_DEVICES", 10000))
+
+    # Ограничения входного потока: длина кадра (8192 - максимум протокола; буфер
+    # подключения не больше длины кадра + 5 байт), пропущенных байт в пакете (не меньше
+    # MAX_SKIPPED_BYTES и доли MAX_SKIPPED_RATIO от длины пакета) и время разбора
+    # пакета (секунды)
+    MAX_FRAME_LENGTH: int = int(os.getenv("GALILEOSKY_MAX_FRAME_LENGTH", 8192))
+    MAX_SKIPPED_BYTES: int = int(os.getenv("GALILEOSKY_MAX_SKIPPED_BYTES", 64))
+    MAX_SKIPPED_RATIO: float = float(os.getenv("GALILEOSKY_MAX_SKIPPED_RATIO", 0.5))
+    PARSE_TIME_BUDGET: float = float(os.getenv("GALILEOSKY_PARSE_TIME_BUDGET", 0.05))
+
+    # Сколько секунд ждать обработки полученных кадров при остановке и перезапуске
+    SHUTDOWN_TIMEOUT: float = float(os.getenv("GALILEOSKY_SHUTDOWN_TIMEOUT", 30))
+
+    # Очередность обработки кадров: лимит архивных кадров на устройство в секунду
+    # (0 - без лимита), запас корзины, слотов за итерацию цикла и одновременно
+    INGEST_ARCHIVE_RATE: float = float(os.getenv("GALILEOSKY_INGEST_ARCHIVE_RATE", 20))
+    INGEST_ARCHIVE_BURST: float = float(os.getenv("GALILEOSKY_INGEST_ARCHIVE_BURST", 40))
+    INGEST_BATCH_SIZE: int = int(os.getenv("GALILEOSKY_INGEST_BATCH_SIZE", 32))
+    INGEST_MAX_IN_FLIGHT: int = int(os.getenv("GALILEOSKY_INGEST_MAX_IN_FLIGHT", 64))
+    # Через сколько секунд простоя удалять корзину архивных кадров устройства
+    INGEST_BUCKET_IDLE: float = float(os.getenv("GALILEOSKY_INGEST_BUCKET_IDLE", 600))
+
+    # Последнее состояние устройств: размер ячейки сетки (градусы) и файл геозон (JSON)
+    STATE_CELL_DEG: float = float(os.getenv("GALILEOSKY_STATE_CELL_DEG", 0.1))
+    GEOFENCES_PATH: str = os.getenv("GALILEOSKY_GEOFENCES", "")
+    # Сколько ячеек сетки может покрывать одна геозона (0 - без ограничения)
+    GEOFENCE_MAX_CELLS: int = int(os.getenv("GALILEOSKY_GEOFENCE_MAX_CELLS", 10000))
+
+    # Отправка замеров с временем терминала в VictoriaMetrics (пусто - выключено)
+    REMOTE_WRITE_URL: str = os.getenv("GALILEOSKY_REMOTE_WRITE_URL", "")
+    REMOTE_WRITE_BATCH_SIZE: int = int(os.getenv("GALILEOSKY_REMOTE_WRITE_BATCH_SIZE", 5000))
+    REMOTE_WRITE_FLUSH_INTERVAL: float = float(os.getenv("GALILEOSKY_REMOTE_WRITE_FLUSH_INTERVAL", 5))
+    REMOTE_WRITE_SPOOL_DIR: str = os.getenv("GALILEOSKY_REMOTE_WRITE_SPOOL_DIR", "remote_write_spool")
+    REMOTE_WRITE_SPOOL_MAX_BYTES: int = int(os.getenv("GALILEOSKY_REMOTE_WRITE_SPOOL_MAX_BYTES", 256 * 1024 * 1024))
+
+    # Хранилище JSON Lines и ротация сегментов
+    STORAGE_PATH: str = os.getenv("GALILEOSKY_STORAGE_PATH", "parsed_data.jsonl")
+    ROTATE_MAX_BYTES: int = int(os.getenv("GALILEOSKY_ROTATE_MAX_BYTES", 64 * 1024 * 1024))
+    ROTATE_INTERVAL: int = int(os.getenv("GALILEOSKY_ROTATE_INTERVAL", 24 * 60 * 60))
+    ROTATE_COMPRESSION: str = os.getenv("GALILEOSKY_ROTATE_COMPRESSION", "zstd")
+    ROTATE_INDEX_EVERY: int = int(os.getenv("GALILEOSKY_ROTATE_INDEX_EVERY", 1000))
 
 config = Config()
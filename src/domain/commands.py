@@ -0,0 +1,54 @@
+import struct
+
+HEADER = 0x01
+
+TAG_IMEI = 0x03
+TAG_DEVICE_ID = 0x04
+TAG_COMMAND_NUMBER = 0xE0
+TAG_COMMAND_TEXT = 0xE1
+
+COMMAND_ENCODING = "cp1251"
+MAX_COMMAND_LENGTH = 0xFF
+
+
+def crc16_modbus(data: bytes) -> int:
+    """
+    Контрольная сумма CRC-16 Modbus (полином 0xA001, начальное значение 0xFFFF).
+    """
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 1:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+def build_command_packet(imei: str, device_id: int, command_number: int, text: str) -> bytes:
+    """
+    Собирает пакет команды терминалу.
+
+    Структура: 0x01, длина (2 байта), 0x03 IMEI (15 байт), 0x04 номер
+    терминала (2 байта), 0xE0 номер команды (4 байта), 0xE1 длина и текст
+    команды (CP1251), CRC-16 Modbus по всему пакету начиная с заголовка.
+
+    :raises ValueError: Если IMEI или текст команды не помещаются в пакет.
+    """
+    imei_bytes = imei.encode("ascii")
+    if len(imei_bytes) != 15:
+        raise ValueError(f"IMEI must be 15 characters, got {imei!r}")
+
+    text_bytes = text.encode(COMMAND_ENCODING)
+    if len(text_bytes) > MAX_COMMAND_LENGTH:
+        raise ValueError(f"Command is too long: {len(text_bytes)} bytes")
+
+    body = (
+        bytes([TAG_IMEI]) + imei_bytes
+        + bytes([TAG_DEVICE_ID]) + struct.pack("<H", device_id)
+        + bytes([TAG_COMMAND_NUMBER]) + struct.pack("<I", command_number)
+        + bytes([TAG_COMMAND_TEXT, len(text_bytes)]) + text_bytes
+    )
+    packet = bytes([HEADER]) + struct.pack("<H", len(body)) + body
+    return packet + struct.pack("<H", crc16_modbus(packet))
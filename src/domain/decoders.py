@@ -1,66 +1,98 @@
 import struct
-from typing import List, Any, Dict, Union
+from typing import AbstractSet, List, Any, Callable, Dict, FrozenSet, Optional, Union
 from src.domain.mercury import Mercury230Decoder
+from src.domain.tags import Tags, Tag
 
 class TagDecoder:
     """
     Сервис для декодирования сырых байтов тегов в человекочитаемые значения.
     """
 
+    # Заполняются после объявления класса
+    _DECODERS: Dict[str, Callable[[bytes], Any]] = {}
+    KINDS: FrozenSet[str] = frozenset()
+
     @staticmethod
-    def decode(tag_num: int, data: List[int]) -> Any:
+    def decode(tag_num: int, data: List[int], extended_fields: Optional[AbstractSet[int]] = None) -> Any:
         """
-        Декодирует данные тега на основе его номера.
+        Декодирует данные тега по скомпилированной схеме тегов.
+
+        :param extended_fields: Номера подтегов 0xFE, которые нужно декодировать
+            (None - все известные).
         """
         if not data:
             return None
 
         byte_data = bytes(data)
+        tag = Tags.get_tag(tag_num)
+        if tag is None:
+            return byte_data.hex().upper()
 
         try:
-            if tag_num == 0x10:  # Номер записи
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num == 0x20:  # Дата и время (Unix time)
-                return TagDecoder._decode_uint32(byte_data)
-            elif tag_num == 0x21:  # Миллисекунды
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num == 0x30:  # Координаты
-                return TagDecoder._decode_coordinates(byte_data)
-            elif tag_num == 0x33:  # Скорость и направление
-                return TagDecoder._decode_speed_direction(byte_data)
-            elif tag_num == 0x34:  # Высота
-                return TagDecoder._decode_int16(byte_data)
-            elif tag_num == 0x35:  # HDOP
-                return TagDecoder._decode_uint8(byte_data)
-            elif tag_num == 0x40:  # Статус устройства
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num in (0x41, 0x42):  # Напряжение питания/АКБ
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num == 0x43:  # Температура
-                return TagDecoder._decode_int8(byte_data)
-            elif tag_num == 0x48:  # Расширенный статус
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num == 0x49:  # Канал передачи
-                return TagDecoder._decode_uint8(byte_data)
-            elif tag_num in range(0x50, 0x56):  # Входы 0-5
-                return TagDecoder._decode_uint16(byte_data)
-            elif tag_num in (0x70, 0x71, 0x72, 0x73, 0x74, 0x75, 0x76, 0x77):  # Термометры
-                return TagDecoder._decode_thermometer(byte_data)
-            elif tag_num == 0xD4:  # Пробег
-                return TagDecoder._decode_uint32(byte_data)
-            elif tag_num == 0xEA: # Массив пользователя (Меркурий 230?)
-                 # Пытаемся декодировать как Меркурий
-                 mercury_data = Mercury230Decoder.decode(data)
-                 if mercury_data:
-                     return mercury_data
-                 return f"Raw: {byte_data.hex().upper()}"
-            elif tag_num == 0xFE: # Расширенные теги
-                 return f"Raw: {byte_data.hex().upper()}"
-            else:
-                return byte_data.hex().upper()
+            if tag.decoder == "mercury":  # Массив пользователя (Меркурий 230?)
+                # Пытаемся декодировать как Меркурий
+                mercury_data = Mercury230Decoder.decode(data)
+                if mercury_data:
+                    return mercury_data
+                return f"Raw: {byte_data.hex().upper()}"
+            if tag.decoder == "extended":  # Расширенные теги
+                return TagDecoder._decode_extended(byte_data, extended_fields)
+            return TagDecoder._decode_value(tag, byte_data)
         except struct.error:
              return f"Error decoding: {byte_data.hex()}"
 
+    @staticmethod
+    def _decode_value(tag: Tag, data: bytes) -> Any:
+        """
+        Декодирует значение тега фиксированной длины (основного или подтега 0xFE).
+        """
+        if tag.struct is not None:
+            values = tag.struct.unpack(data)
+            if tag.fields:
+                scales = tag.scale or [None] * len(values)
+                return {
+                    field: round(value * scale, 6) if scale not in (None, 1) else value
+                    for field, value, scale in zip(tag.fields, values, scales)
+                }
+            if tag.scale is not None:
+                return round(values[0] * tag.scale, 6)
+            return values[0]
+
+        decoder = TagDecoder._DECODERS.get(tag.decoder)
+        if decoder is None:
+            return data.hex().upper()
+        return decoder(data)
+
+    @staticmethod
+    def _decode_extended(data: bytes, wanted: Optional[AbstractSet[int]] = None) -> Dict[str, Any]:
+        """
+        Разбирает данные тега 0xFE: последовательность записей
+        [номер подтега (2 байта)][данные фиксированной длины].
+
+        Подтеги вне wanted пропускаются по длине без декодирования.
+        Если встретился подтег, которого нет в схеме, его длина неизвестна:
+        остаток сохраняется как "raw".
+        """
+        values: Dict[str, Any] = {}
+        index = 0
+        end = len(data)
+
+        while index + 2 <= end:
+            num = data[index] | (data[index + 1] << 8)
+            sub_tag = Tags.get_extended(num)
+            value_end = index + 2 + sub_tag.length if sub_tag else end + 1
+            if value_end > end:
+                values["raw"] = data[index:].hex().upper()
+                return values
+
+            if wanted is None or num in wanted:
+                values[sub_tag.tag_hex_str] = TagDecoder._decode_value(sub_tag, data[index + 2:value_end])
+            index = value_end
+
+        if index < end:
+            values["raw"] = data[index:].hex().upper()
+        return values
+
     @staticmethod
     def _decode_uint8(data: bytes) -> int:
         return struct.unpack('<B', data)[0]
@@ -90,9 +122,10 @@ class TagDecoder:
         if len(data) != 9:
             return {"error": "Invalid length for coords"}
             
-        lat_raw = struct.unpack('<i', data[0:4])[0]
-        lon_raw = struct.unpack('<i', data[4:8])[0]
-        status_byte = data[8]
+        # Байт 0: число спутников и корректность, далее широта и долгота
+        status_byte = data[0]
+        lat_raw = struct.unpack('<i', data[1:5])[0]
+        lon_raw = struct.unpack('<i', data[5:9])[0]
         
         satellites = status_byte & 0x0F
         
@@ -139,3 +172,67 @@ class TagDecoder:
             "temperature": temperature_raw, 
             "status": "ok"
         }
+
+    @staticmethod
+    def _decode_hex(data: bytes) -> str:
+        return data.hex().upper()
+
+    @staticmethod
+    def _decode_ascii(data: bytes) -> str:
+        return data.decode('ascii', errors='replace').rstrip('\x00')
+
+    @staticmethod
+    def _decode_cp1251(data: bytes) -> str:
+        return data.decode('cp1251', errors='replace')
+
+    @staticmethod
+    def _decode_fuel_sensor(data: bytes) -> Dict[str, int]:
+        if len(data) != 3:
+            return {"error": "Invalid length for fuel sensor"}
+
+        # Младшие 2 байта: уровень топлива, старший: температура (signed)
+        level, temperature = struct.unpack('<Hb', data)
+        return {"level": level, "temperature": temperature}
+
+    @staticmethod
+    def _decode_ds1923(data: bytes) -> Dict[str, Union[int, float]]:
+        if len(data) != 3:
+            return {"error": "Invalid length for DS1923"}
+
+        sensor_id, temperature, humidity_raw = struct.unpack('<BbB', data)
+        return {
+            "id": sensor_id,
+            "temperature": temperature,
+            "humidity": round(humidity_raw * 100 / 255, 2)
+        }
+
+    @staticmethod
+    def _decode_can_a1(data: bytes) -> Dict[str, float]:
+        if len(data) != 4:
+            return {"error": "Invalid length for CAN_A1"}
+
+        fuel_raw, coolant_raw, rpm_raw = struct.unpack('<BBH', data)
+        return {
+            "fuel_level_pct": round(fuel_raw * 0.4, 1),
+            "coolant_temperature": coolant_raw - 40,
+            "rpm": rpm_raw * 0.125
+        }
+
+
+# Декодеры схемы тегов по имени (поле "decoder" в tag_schema.json)
+TagDecoder._DECODERS = {
+    "hex": TagDecoder._decode_hex,
+    "ascii": TagDecoder._decode_ascii,
+    "cp1251": TagDecoder._decode_cp1251,
+    "coordinates": TagDecoder._decode_coordinates,
+    "speed_direction": TagDecoder._decode_speed_direction,
+    "thermometer": TagDecoder._decode_thermometer,
+    "fuel_sensor": TagDecoder._decode_fuel_sensor,
+    "ds1923": TagDecoder._decode_ds1923,
+    "can_a1": TagDecoder._decode_can_a1,
+}
+
+# Все имена декодеров, допустимые в схеме: struct, mercury и extended
+# разбираются в decode() и _decode_value(), остальные - через _DECODERS
+TagDecoder.KINDS = frozenset(TagDecoder._DECODERS) | {"struct", "mercury", "extended"}
+Tags.register_decoders(TagDecoder.KINDS)
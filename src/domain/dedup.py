@@ -0,0 +1,141 @@
+from collections import OrderedDict, deque
+from typing import Deque, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+from src.domain.models import ParsedPacket, ParsedTag
+
+TAG_RECORD_NUMBER = 0x10
+TAG_TIMESTAMP = 0x20
+
+RecordKey = Tuple[Optional[int], int]
+
+
+class _DeviceWindow:
+    """Последние window ключей записей одного устройства (FIFO-вытеснение)."""
+
+    __slots__ = ("keys", "order")
+
+    def __init__(self, window: int):
+        self.keys: Set[RecordKey] = set()
+        self.order: Deque[RecordKey] = deque(maxlen=window)
+
+    def add(self, key: RecordKey):
+        if key in self.keys:
+            return
+        if len(self.order) == self.order.maxlen:
+            self.keys.discard(self.order[0])
+        self.order.append(key)
+        self.keys.add(key)
+
+
+class RecordDeduplicator:
+    """
+    Подавление повторно присланных архивных записей.
+
+    Терминал, не получивший подтверждение, присылает те же записи снова.
+    Запись идентифицируется парой (номер записи 0x10, время 0x20) в пределах
+    устройства. Для каждого устройства хранится скользящее окно последних
+    window ключей, число устройств ограничено max_devices (вытесняются
+    давно не присылавшие данные).
+
+    Проверка (check) и запоминание (commit) разделены: ключи запоминаются
+    только после сохранения записей, а уже встречавшиеся записи убираются
+    из пакета по одной (drop_records), новые записи того же пакета остаются.
+    """
+
+    REQUIRED_FIELDS: FrozenSet[str] = frozenset({"record_number", "timestamp"})
+
+    def __init__(self, window: int = 4096, max_devices: int = 10000):
+        self.window = window
+        self.max_devices = max_devices
+        self._devices: "OrderedDict[Hashable, _DeviceWindow]" = OrderedDict()
+
+    @staticmethod
+    def split_records(packet: ParsedPacket) -> List[Tuple[Optional[RecordKey], List[ParsedTag]]]:
+        """
+        Делит теги пакета на записи по сырым данным, без декодирования.
+
+        Запись начинается с тега 0x10 (или с тега 0x20, если у текущей записи
+        время уже есть). Ключ записи - (номер записи, время); у тегов до первой
+        записи (заголовок с IMEI) и у записи без времени ключа нет (None).
+        """
+        records: List[Tuple[Optional[RecordKey], List[ParsedTag]]] = []
+        tags: List[ParsedTag] = []
+        record_number: Optional[int] = None
+        timestamp: Optional[int] = None
+
+        def close():
+            if tags:
+                records.append(((record_number, timestamp) if timestamp is not None else None, tags))
+
+        for parsed_tag in packet.tags:
+            num = parsed_tag.tag.num
+            data = parsed_tag.data
+            if num == TAG_RECORD_NUMBER or (num == TAG_TIMESTAMP and timestamp is not None):
+                close()
+                tags, record_number, timestamp = [], None, None
+            if num == TAG_RECORD_NUMBER and len(data) == 2:
+                record_number = data[0] | (data[1] << 8)
+            elif num == TAG_TIMESTAMP and len(data) == 4:
+                timestamp = data[0] | (data[1] << 8) | (data[2] << 16) | (data[3] << 24)
+            tags.append(parsed_tag)
+        close()
+        return records
+
+    @staticmethod
+    def record_keys(packet: ParsedPacket) -> List[RecordKey]:
+        """Ключи записей пакета (пакет может содержать несколько записей)."""
+        return [key for key, _ in RecordDeduplicator.split_records(packet) if key is not None]
+
+    def check(self, device: Hashable, keys: List[RecordKey]) -> Set[RecordKey]:
+        """
+        Проверяет записи пакета, не запоминая их.
+
+        :return: Ключи, которые уже встречались у устройства.
+        """
+        if not keys or self.window <= 0:
+            return set()
+        window = self._devices.get(device)
+        if window is None:
+            return set()
+        self._devices.move_to_end(device)
+        return {key for key in keys if key in window.keys}
+
+    def commit(self, device: Hashable, keys: List[RecordKey]):
+        """
+        Запоминает записи пакета. Вызывается после того, как записи сохранены:
+        если сохранение не удалось, повтор от терминала не будет отброшен.
+        """
+        if not keys or self.window <= 0:
+            return
+
+        window = self._devices.get(device)
+        if window is None:
+            window = _DeviceWindow(self.window)
+            self._devices[device] = window
+            if len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device)
+
+        for key in keys:
+            window.add(key)
+
+    @staticmethod
+    def drop_records(packet: ParsedPacket, seen: Set[RecordKey]) -> ParsedPacket:
+        """
+        Убирает из пакета записи с ключами из seen и повторы записей внутри пакета.
+        Теги без ключа (заголовок) остаются.
+        """
+        kept: List[ParsedTag] = []
+        kept_keys: Set[RecordKey] = set()
+        for key, tags in RecordDeduplicator.split_records(packet):
+            if key is not None:
+                if key in seen or key in kept_keys:
+                    continue
+                kept_keys.add(key)
+            kept.extend(tags)
+        return ParsedPacket(kept, packet.skipped_bytes, packet.truncated)
+
+    @property
+    def devices_tracked(self) -> int:
+        return len(self._devices)
@@ -0,0 +1,301 @@
+import math
+from collections import deque
+from typing import Any, Deque, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE = 111_320.0
+
+# Признак корректности координат (тег 0x30): 0 - ГЛОНАСС/GPS, 2 - базовые станции
+VALID_CORRECTNESS = (0, 2)
+
+Cell = Tuple[int, int]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по дуге большого круга в метрах."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def radius_bbox(lat: float, lon: float, radius_m: float) -> Tuple[float, float, float, float]:
+    """Описанный вокруг круга прямоугольник (min_lat, min_lon, max_lat, max_lon)."""
+    d_lat = radius_m / METERS_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    d_lon = 180.0 if cos_lat < 1e-6 else min(180.0, radius_m / (METERS_PER_DEGREE * cos_lat))
+    return lat - d_lat, lon - d_lon, lat + d_lat, lon + d_lon
+
+
+class GridIndex:
+    """
+    Равномерная сетка по широте/долготе: ячейка -> множество ключей.
+    Перемещение ключа - два обращения к словарю, запросы перебирают
+    только ячейки, пересекающие область запроса.
+    """
+
+    def __init__(self, cell_deg: float = 0.1):
+        if cell_deg <= 0:
+            raise ValueError("cell_deg must be positive")
+        self.cell_deg = cell_deg
+        self._cells: Dict[Cell, Set[str]] = {}
+
+    def cell(self, lat: float, lon: float) -> Cell:
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def add(self, key: str, cell: Cell):
+        self._cells.setdefault(cell, set()).add(key)
+
+    def discard(self, key: str, cell: Cell):
+        keys = self._cells.get(cell)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._cells[cell]
+
+    def _cell_range(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Tuple[Cell, Cell]:
+        # Пересечение антимеридиана не поддерживается: область обрезается по границам
+        return (
+            self.cell(max(min_lat, -90.0), max(min_lon, -180.0)),
+            self.cell(min(max_lat, 90.0), min(max_lon, 180.0)),
+        )
+
+    def count_cells(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> int:
+        """Число ячеек, пересекающих прямоугольник (без их перечисления)."""
+        (min_row, min_col), (max_row, max_col) = self._cell_range(min_lat, min_lon, max_lat, max_lon)
+        return max(0, max_row - min_row + 1) * max(0, max_col - min_col + 1)
+
+    def cells_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[Cell]:
+        """Все ячейки, пересекающие прямоугольник."""
+        (min_row, min_col), (max_row, max_col) = self._cell_range(min_lat, min_lon, max_lat, max_lon)
+        return [
+            (row, col)
+            for row in range(min_row, max_row + 1)
+            for col in range(min_col, max_col + 1)
+        ]
+
+    def keys_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> Iterable[str]:
+        """Ключи из ячеек, пересекающих прямоугольник (точную проверку делает вызывающий)."""
+        (min_row, min_col), (max_row, max_col) = self._cell_range(min_lat, min_lon, max_lat, max_lon)
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            # Область больше занятой части сетки - дешевле пройти по занятым ячейкам
+            for (row, col), keys in self._cells.items():
+                if min_row <= row <= max_row and min_col <= col <= max_col:
+                    yield from keys
+            return
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield from self._cells.get((row, col), ())
+
+    def keys_in_cell(self, cell: Cell) -> Set[str]:
+        return self._cells.get(cell, set())
+
+
+class Geofence:
+    """
+    Геозона: круг (lat, lon, radius_m) или прямоугольник bbox.
+    """
+
+    def __init__(self, name: str, lat: Optional[float] = None, lon: Optional[float] = None,
+                 radius_m: Optional[float] = None,
+                 bbox: Optional[Tuple[float, float, float, float]] = None):
+        if bbox is None and None in (lat, lon, radius_m):
+            raise ValueError(f"Geofence {name!r} needs lat/lon/radius_m or bbox")
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.radius_m = radius_m
+        self.bbox = tuple(bbox) if bbox is not None else radius_bbox(lat, lon, radius_m)
+        self.is_circle = bbox is None
+
+    @classmethod
+    def from_dict(cls, entry: Dict[str, Any]) -> "Geofence":
+        return cls(
+            str(entry["name"]),
+            lat=entry.get("lat"),
+            lon=entry.get("lon"),
+            radius_m=entry.get("radius_m"),
+            bbox=entry.get("bbox"),
+        )
+
+    def contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        return not self.is_circle or haversine_m(self.lat, self.lon, lat, lon) <= self.radius_m
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.is_circle:
+            return {"name": self.name, "lat": self.lat, "lon": self.lon, "radius_m": self.radius_m}
+        return {"name": self.name, "bbox": list(self.bbox)}
+
+
+class DeviceState:
+    """Последнее известное состояние устройства."""
+
+    __slots__ = ("imei", "timestamp", "latitude", "longitude", "satellites", "speed_kmh",
+                 "direction_deg", "supply_voltage", "battery_voltage", "cell", "geofences")
+
+    def __init__(self, imei: str):
+        self.imei = imei
+        self.timestamp: Optional[int] = None
+        self.latitude: Optional[float] = None
+        self.longitude: Optional[float] = None
+        self.satellites: Optional[int] = None
+        self.speed_kmh: Optional[float] = None
+        self.direction_deg: Optional[float] = None
+        self.supply_voltage: Optional[int] = None
+        self.battery_voltage: Optional[int] = None
+        self.cell: Optional[Cell] = None
+        self.geofences: FrozenSet[str] = frozenset()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "imei": self.imei,
+            "timestamp": self.timestamp,
+            "latitude": self.latitude,
+            "longitude": self.longitude,
+            "satellites": self.satellites,
+            "speed_kmh": self.speed_kmh,
+            "direction_deg": self.direction_deg,
+            "supply_voltage": self.supply_voltage,
+            "battery_voltage": self.battery_voltage,
+            "geofences": sorted(self.geofences),
+        }
+
+
+class DeviceStateStore:
+    """
+    Последнее состояние устройств в памяти с пространственным индексом.
+
+    Обновление - O(1): запись полей и перенос устройства между ячейками
+    сетки. Запросы по радиусу и прямоугольнику проверяют только устройства
+    из пересекающих область ячеек. Геозоны тоже разложены по ячейкам,
+    поэтому при перемещении проверяются только зоны текущей ячейки.
+    Архивные записи старше уже известного состояния его не перезаписывают.
+    """
+
+    # Теги, из которых собирается состояние (время - чтобы не откатывать состояние архивом)
+    REQUIRED_FIELDS: FrozenSet[str] = frozenset(
+        {"timestamp", "coordinates", "speed_direction", "supply_voltage", "battery_voltage"}
+    )
+
+    def __init__(self, cell_deg: float = 0.1, geofences: Iterable[Geofence] = (), events_size: int = 1000,
+                 max_fence_cells: int = 10000):
+        self.max_fence_cells = max_fence_cells
+        self.devices: Dict[str, DeviceState] = {}
+        self.geofences: Dict[str, Geofence] = {}
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=events_size)
+        self._index = GridIndex(cell_deg)
+        self._fence_index = GridIndex(cell_deg)
+        self._fence_cells: Dict[str, List[Cell]] = {}
+        for fence in geofences:
+            self.add_geofence(fence)
+
+    def update(self, imei: str, tags: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Обновляет состояние устройства по декодированным тегам записи.
+
+        :return: События входа/выхода из геозон, вызванные обновлением.
+        """
+        state = self.devices.get(imei)
+        if state is None:
+            state = self.devices[imei] = DeviceState(imei)
+
+        timestamp = tags.get("0x20")
+        if isinstance(timestamp, int):
+            if state.timestamp is not None and timestamp < state.timestamp:
+                return []
+            state.timestamp = timestamp
+
+        speed = tags.get("0x33")
+        if isinstance(speed, dict) and "speed_kmh" in speed:
+            state.speed_kmh = speed["speed_kmh"]
+            state.direction_deg = speed["direction_deg"]
+        supply = tags.get("0x41")
+        if isinstance(supply, int):
+            state.supply_voltage = supply
+        battery = tags.get("0x42")
+        if isinstance(battery, int):
+            state.battery_voltage = battery
+
+        coords = tags.get("0x30")
+        if isinstance(coords, dict) and coords.get("correctness") in VALID_CORRECTNESS:
+            return self._move(state, coords["latitude"], coords["longitude"], coords["satellites"])
+        return []
+
+    def get(self, imei: str) -> Optional[DeviceState]:
+        return self.devices.get(imei)
+
+    def within_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> List[DeviceState]:
+        result = []
+        for imei in self._index.keys_in_bbox(min_lat, min_lon, max_lat, max_lon):
+            state = self.devices[imei]
+            if min_lat <= state.latitude <= max_lat and min_lon <= state.longitude <= max_lon:
+                result.append(state)
+        return result
+
+    def within_radius(self, lat: float, lon: float, radius_m: float) -> List[Tuple[float, DeviceState]]:
+        """:return: Пары (расстояние в метрах, состояние), по возрастанию расстояния."""
+        result = []
+        for imei in self._index.keys_in_bbox(*radius_bbox(lat, lon, radius_m)):
+            state = self.devices[imei]
+            distance = haversine_m(lat, lon, state.latitude, state.longitude)
+            if distance <= radius_m:
+                result.append((distance, state))
+        result.sort(key=lambda item: item[0])
+        return result
+
+    def add_geofence(self, fence: Geofence):
+        """
+        Добавляет или заменяет геозону. Членство устройств пересчитается при их следующем обновлении.
+
+        :raises ValueError: Если геозона покрывает больше max_fence_cells ячеек сетки.
+        """
+        count = self._fence_index.count_cells(*fence.bbox)
+        if self.max_fence_cells and count > self.max_fence_cells:
+            raise ValueError(
+                f"Geofence {fence.name!r} covers {count} grid cells, the limit is {self.max_fence_cells}"
+            )
+        self.remove_geofence(fence.name)
+        cells = self._fence_index.cells_in_bbox(*fence.bbox)
+        self.geofences[fence.name] = fence
+        self._fence_cells[fence.name] = cells
+        for cell in cells:
+            self._fence_index.add(fence.name, cell)
+
+    def remove_geofence(self, name: str) -> bool:
+        if name not in self.geofences:
+            return False
+        for cell in self._fence_cells.pop(name):
+            self._fence_index.discard(name, cell)
+        del self.geofences[name]
+        return True
+
+    def _move(self, state: DeviceState, lat: float, lon: float, satellites: int) -> List[Dict[str, Any]]:
+        cell = self._index.cell(lat, lon)
+        if cell != state.cell:
+            if state.cell is not None:
+                self._index.discard(state.imei, state.cell)
+            self._index.add(state.imei, cell)
+            state.cell = cell
+        state.latitude = lat
+        state.longitude = lon
+        state.satellites = satellites
+
+        inside = frozenset(
+            name for name in self._fence_index.keys_in_cell(cell)
+            if self.geofences[name].contains(lat, lon)
+        )
+        # Зоны, удалённые после последнего обновления, не дают события выхода
+        previous = state.geofences & self.geofences.keys()
+        events = [
+            {"imei": state.imei, "geofence": name, "event": kind,
+             "timestamp": state.timestamp, "latitude": lat, "longitude": lon}
+            for kind, names in (("exit", previous - inside), ("enter", inside - previous))
+            for name in sorted(names)
+        ]
+        state.geofences = inside
+        self.events.extend(events)
+        return events
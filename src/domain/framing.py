@@ -0,0 +1,63 @@
+from typing import List
+
+from src.config import config
+
+HEADER = 0x01
+HEADER_BYTES = b"\x01"
+# Заголовок (1) + длина (2) и CRC (2)
+PREFIX_LENGTH = 3
+CRC_LENGTH = 2
+
+
+class FrameSplitter:
+    """
+    Разбиение потока байт подключения на кадры (0x01, длина, данные, CRC).
+
+    Стоимость обработки линейна по числу полученных байт: буфер не копируется
+    на каждый кадр, поиск заголовка после мусора идёт через bytearray.find,
+    а не по одному байту. Заголовок с длиной больше max_frame_length считается
+    мусором, поэтому после каждого feed() в буфере остаётся не больше одного
+    незавершённого кадра: буфер подключения ограничен max_frame_length + 5 байт
+    без отдельной настройки.
+    """
+
+    def __init__(self, max_frame_length: int = config.MAX_FRAME_LENGTH):
+        self.max_frame_length = max_frame_length
+        self.buffer = bytearray()
+        # Счётчики с начала подключения
+        self.skipped = 0
+        self.oversized = 0
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Добавляет данные и возвращает завершённые кадры."""
+        buffer = self.buffer
+        buffer += chunk
+        frames: List[bytes] = []
+        pos = 0
+        end = len(buffer)
+
+        while end - pos >= PREFIX_LENGTH:
+            if buffer[pos] != HEADER:
+                header = buffer.find(HEADER_BYTES, pos)
+                if header < 0:
+                    header = end
+                self.skipped += header - pos
+                pos = header
+                continue
+
+            # Старший бит длины - признак архивных данных, не часть длины
+            length = (buffer[pos + 1] | (buffer[pos + 2] << 8)) & 0x7FFF
+            if length > self.max_frame_length:
+                self.oversized += 1
+                self.skipped += 1
+                pos += 1
+                continue
+
+            frame_end = pos + PREFIX_LENGTH + length + CRC_LENGTH
+            if frame_end > end:
+                break
+            frames.append(bytes(buffer[pos:frame_end]))
+            pos = frame_end
+
+        del buffer[:pos]
+        return frames
@@ -1,11 +1,19 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from typing import Dict, Any, FrozenSet, Optional
 
 class IStorage(ABC):
     """
     Интерфейс для сохранения распарсенных данных.
     """
     
+    @property
+    def required_fields(self) -> Optional[FrozenSet[str]]:
+        """
+        Поля схемы тегов, которые хранилище использует (см. FieldProjection).
+        None - нужны все теги.
+        """
+        return None
+
     @abstractmethod
     async def save(self, packet_data: Dict[str, Any]):
         """
@@ -13,3 +21,17 @@ class IStorage(ABC):
         :param packet_data: Словарь с данными пакета.
         """
         pass
+
+    async def save_rejected(self, packet_data: Dict[str, Any]):
+        """
+        Сохраняет пакет, который не удалось разобрать полностью, с сырыми данными,
+        чтобы его можно было разобрать повторно.
+        :param packet_data: Словарь с причиной, источником и сырыми данными пакета.
+        """
+        pass
+
+    async def close(self):
+        """
+        Сбрасывает буферы и освобождает ресурсы хранилища.
+        """
+        pass
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from dataclasses import dataclass
 from src.domain.tags import Tag
 
@@ -20,4 +20,5 @@ class ParsedPacket:
     Модель данных распарсенного пакета.
     """
     tags: List[ParsedTag]
-    skipped_bytes: List[int] # Байты, которые не удалось распознать как теги
+    skipped_bytes: int = 0 # Число байт, которые не удалось распознать как теги
+    truncated: Optional[str] = None # Причина прекращения разбора по лимиту
@@ -1,41 +1,75 @@
+import time
 from typing import List, Tuple, Optional
 from src.domain.tags import Tags, Tag
 from src.domain.models import ParsedTag, ParsedPacket
+from src.domain.projection import FieldProjection
 
 class TagParser:
     """
     Парсер для последовательного чтения тегов из байтового массива.
+
+    После неизвестного байта границы следующих тегов не определены, поэтому
+    разбор пакета прекращается, если пропущено больше max_skipped_bytes байт
+    и больше доли max_skipped_ratio от длины пакета, или превышен бюджет
+    времени time_budget (секунды, 0 - без ограничения). Лимит растёт с длиной
+    пакета: тег, которого нет в схеме, в длинном пакете не должен обрывать
+    разбор следующих за ним записей.
     """
 
-    def parse(self, data: List[int]) -> ParsedPacket:
+    # Как часто (в итерациях) проверять бюджет времени
+    BUDGET_CHECK_EVERY = 256
+
+    def __init__(self, max_skipped_bytes: int = 64, time_budget: float = 0.05, max_skipped_ratio: float = 0.5):
+        self.max_skipped_bytes = max_skipped_bytes
+        self.max_skipped_ratio = max_skipped_ratio
+        self.time_budget = time_budget
+
+    def parse(self, data: List[int], projection: Optional[FieldProjection] = None) -> ParsedPacket:
         """
         Парсит массив байтов, извлекая теги.
         
         :param data: Список байтов.
-        :return: ParsedPacket, содержащий найденные теги и пропущенные байты.
+        :param projection: Теги, которые нужно извлечь. Остальные пропускаются
+            по длине без копирования данных. None - извлекать все.
+        :return: ParsedPacket, содержащий найденные теги и число пропущенных байт.
         """
         index = 0
         parsed_tags = []
-        skipped_bytes = []
+        skipped_bytes = 0
+        truncated = None
+        max_skipped = max(self.max_skipped_bytes, int(len(data) * self.max_skipped_ratio))
+        deadline = time.perf_counter() + self.time_budget if self.time_budget > 0 else None
+        iterations = 0
         
         while index < len(data):
+            iterations += 1
+            if deadline is not None and iterations % self.BUDGET_CHECK_EVERY == 0 and time.perf_counter() > deadline:
+                truncated = "time_budget"
+                break
+
             byte = data[index]
             tag = Tags.get_tag(byte)
             
             if tag:
                 try:
-                    parsed_tag, new_index = self._process_tag(tag, data, index)
-                    parsed_tags.append(parsed_tag)
+                    if projection is None or projection.wants(byte):
+                        parsed_tag, new_index = self._process_tag(tag, data, index)
+                        parsed_tags.append(parsed_tag)
+                    else:
+                        _, new_index = self._tag_bounds(tag, data, index)
                     index = new_index
+                    continue
                 except (IndexError, ValueError):
-                    skipped_bytes.append(byte)
-                    index += 1
-            else:
-                # Байт не является известным тегом
-                skipped_bytes.append(byte)
-                index += 1
+                    pass
+
+            # Байт не является известным тегом или данных тега не хватает
+            skipped_bytes += 1
+            index += 1
+            if skipped_bytes > max_skipped:
+                truncated = "skipped_bytes"
+                break
                 
-        return ParsedPacket(tags=parsed_tags, skipped_bytes=skipped_bytes)
+        return ParsedPacket(tags=parsed_tags, skipped_bytes=skipped_bytes, truncated=truncated)
 
     def _process_tag(self, tag: Tag, data: List[int], start_index: int) -> Tuple[ParsedTag, int]:
         """
@@ -47,29 +81,29 @@ class TagParser:
         :return: Кортеж (ParsedTag, новый индекс после данных тега).
         :raises IndexError: Если данных недостаточно.
         """
+        data_start, data_end = self._tag_bounds(tag, data, start_index)
+        return ParsedTag(tag=tag, data=data[data_start:data_end]), data_end
+
+    def _tag_bounds(self, tag: Tag, data: List[int], start_index: int) -> Tuple[int, int]:
+        """
+        Определяет границы данных тега без их копирования.
+
+        :return: Кортеж (индекс начала данных, индекс после данных тега).
+        :raises IndexError: Если данных недостаточно.
+        """
         current_index = start_index + 1 # Пропускаем сам байт тега
         
-        data_length = 0
-        
-        if tag.num == 0xEA:
-            # Длина указана в следующем байте (1 байт длины)
-            if current_index >= len(data):
-                raise IndexError("Unexpected end of data for tag 0xEA length")
-            
+        if tag.length_size:
+            # Тег переменной длины: длина (little-endian) указана в следующих байтах
+            if current_index + tag.length_size > len(data):
+                raise IndexError(f"Unexpected end of data for tag {tag.tag_hex_str} length")
+
             data_length = data[current_index]
-            current_index += 1 # Пропускаем байт длины
-            
-        elif tag.num == 0xFE:
-            # Расширенные теги. По описанию: "длина данных указана в следующих байтах".
-            if current_index + 1 >= len(data):
-                raise IndexError("Unexpected end of data for tag 0xFE length")
+            if tag.length_size == 2:
+                data_length |= data[current_index + 1] << 8
+
+            current_index += tag.length_size
 
-            l_low = data[current_index]
-            l_high = data[current_index + 1]
-            data_length = l_low + (l_high << 8)
-            
-            current_index += 2
-            
         else:
             # Обычный тег с фиксированной длиной
             data_length = tag.length
@@ -77,6 +111,4 @@ class TagParser:
         if current_index + data_length > len(data):
              raise IndexError(f"Not enough data for tag {tag.tag_hex_str}. Expected {data_length}, got {len(data) - current_index}")
 
-        tag_data = data[current_index : current_index + data_length]
-        
-        return ParsedTag(tag=tag, data=tag_data), current_index + data_length
+        return current_index, current_index + data_length
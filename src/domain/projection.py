@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, Optional
+
+from src.domain.tags import Tags
+
+EXTENDED_TAG_NUM = 0xFE
+
+# Теги, без которых не работает сам сервис: IMEI и номер устройства (привязка
+# сессии и команд), номер записи и время (дубликаты, метки времени),
+# координаты (состояние устройств), номер и текст ответа на команду
+INTERNAL_TAGS = frozenset({0x03, 0x04, 0x10, 0x20, 0x21, 0x30, 0xE0, 0xE1})
+
+
+@dataclass(frozen=True)
+class FieldProjection:
+    """
+    Набор тегов, которые нужно декодировать.
+    Остальные теги парсер пропускает по длине, декодер их не видит.
+
+    tags - номера основных тегов (None - все),
+    extended - номера подтегов 0xFE (None - все известные схеме).
+    """
+    tags: Optional[FrozenSet[int]] = None
+    extended: Optional[FrozenSet[int]] = None
+
+    def wants(self, tag_num: int) -> bool:
+        return self.tags is None or tag_num in self.tags
+
+    @classmethod
+    def all(cls) -> "FieldProjection":
+        return cls()
+
+    @classmethod
+    def from_fields(cls, fields: Iterable[str]) -> "FieldProjection":
+        """
+        Строит проекцию из имён полей. Служебные теги INTERNAL_TAGS
+        добавляются всегда, даже если их нет в списке.
+
+        Поле может быть номером тега ("0x50"), именем из схемы ("input_0"),
+        именем метрики ("enter0") или именем/номером подтега 0xFE ("rssi", "0x0085").
+
+        :raises ValueError: Если поле не найдено в схеме.
+        """
+        by_name = {tag.name: num for num, tag in Tags.ALL_TAGS.items()}
+
+        tags = set(INTERNAL_TAGS)
+        extended_names = set()
+        for field in fields:
+            if field in Tags.BY_METRIC:
+                tags.add(Tags.BY_METRIC[field].num)
+            elif field in by_name:
+                tags.add(by_name[field])
+            elif field.lower().startswith("0x") and len(field) <= 4 and int(field, 16) in Tags.ALL_TAGS:
+                tags.add(int(field, 16))
+            else:
+                # Всё остальное должно быть подтегом 0xFE
+                extended_names.add(field)
+
+        extended = Tags.resolve_extended(extended_names)
+        if extended:
+            tags.add(EXTENDED_TAG_NUM)
+        elif EXTENDED_TAG_NUM in tags:
+            # Тег 0xFE запрошен целиком
+            return cls(tags=frozenset(tags), extended=None)
+        return cls(tags=frozenset(tags), extended=frozenset(extended))
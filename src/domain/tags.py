@@ -1,59 +1,220 @@
-from typing import Dict, ClassVar, Optional
+import itertools
+import json
+import logging
+import os
+import struct
+import time
+from typing import AbstractSet, Any, Dict, ClassVar, FrozenSet, List, Optional, Union
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "tag_schema.json")
+
+# Размер поля длины для тегов переменной длины
+LENGTH_PREFIXES = {"u8": 1, "u16": 2}
+
 
 class Tag:
-    def __init__(self, num_byte: int, tag: str, length: int, description: str):
+    def __init__(
+        self,
+        num_byte: int,
+        tag: str,
+        length: int,
+        description: str,
+        name: str = "",
+        length_size: int = 0,
+        fmt: Optional[str] = None,
+        scale: Union[float, List[float], None] = None,
+        decoder: str = "hex",
+        metric: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+    ):
         self.num = num_byte
         self.tag_hex_str = tag
         self.length = length
         self.description = description
+        self.name = name
+        # 0 - фиксированная длина, иначе число байт поля длины после номера тега
+        self.length_size = length_size
+        self.struct = struct.Struct(fmt) if fmt else None
+        self.scale = scale
+        self.decoder = decoder
+        self.metric = metric
+        # Имена полей для форматов из нескольких значений (результат - словарь)
+        self.fields = tuple(fields) if fields else None
+
+
+def _parse_num(value: Any) -> int:
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def compile_tag_entries(entries: List[Dict[str, Any]], hex_width: int = 2) -> Dict[int, Tag]:
+    """
+    Компилирует записи схемы в объекты Tag.
+
+    Запись с полем count разворачивается в count последовательных тегов,
+    в name/description/metric подставляется {i} начиная с first_index.
+
+    Имена декодеров здесь не проверяются: их проверяет Tags по реестру
+    TagDecoder (см. Tags.register_decoders).
+
+    :raises ValueError: При дубликатах или несовпадении формата с длиной,
+        полями и масштабом тега.
+    """
+    tags: Dict[int, Tag] = {}
+
+    for entry in entries:
+        first_num = _parse_num(entry["num"])
+        count = entry.get("count", 1)
+        first_index = entry.get("first_index", 0)
+
+        length_spec = entry["length"]
+        if isinstance(length_spec, str):
+            if length_spec not in LENGTH_PREFIXES:
+                raise ValueError(f"Unknown length prefix {length_spec!r} for tag {entry['num']}")
+            length, length_size = 0, LENGTH_PREFIXES[length_spec]
+        else:
+            length, length_size = int(length_spec), 0
+
+        fmt = entry.get("format")
+        decoder = entry.get("decoder", "struct" if fmt else "hex")
+        if decoder == "struct" and not fmt:
+            raise ValueError(f"Tag {entry['num']} uses struct decoder without format")
+        if fmt and length_size == 0 and struct.calcsize(fmt) != length:
+            raise ValueError(f"Format {fmt!r} does not match length {length} for tag {entry['num']}")
+        fields = entry.get("fields")
+        if fields and not fmt:
+            raise ValueError(f"Tag {entry['num']} has fields without format")
+        if fields and len(fields) != len(struct.Struct(fmt).unpack(bytes(struct.calcsize(fmt)))):
+            raise ValueError(f"Fields of tag {entry['num']} do not match format {fmt!r}")
+        # Для тега с полями масштаб задаётся списком на каждое поле, без полей - числом
+        scale = entry.get("scale")
+        if scale is not None and isinstance(scale, list) != bool(fields):
+            raise ValueError(f"Scale of tag {entry['num']} must be a list only when the tag has fields")
+        if fields and scale is not None and len(scale) != len(fields):
+            raise ValueError(f"Scale of tag {entry['num']} does not match fields {fields}")
+
+        for offset in range(count):
+            num = first_num + offset
+            if num in tags:
+                raise ValueError(f"Duplicate tag 0x{num:0{hex_width}X} in schema")
+
+            index = first_index + offset
+            metric = entry.get("metric")
+            tags[num] = Tag(
+                num_byte=num,
+                tag=f"0x{num:0{hex_width}X}",
+                length=length,
+                description=entry.get("description", "").format(i=index),
+                name=entry.get("name", "").format(i=index),
+                length_size=length_size,
+                fmt=fmt,
+                scale=scale,
+                decoder=decoder,
+                metric=metric.format(i=index) if metric else None,
+                fields=fields,
+            )
+
+    return tags
+
+
+def load_tag_schema(path: str) -> Dict[str, Any]:
+    """Загружает файл схемы тегов (JSON)."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
 
 class Tags:
-    # Определение тегов как атрибутов класса для удобного доступа
-    x10 = Tag(num_byte=0x10, tag="0x10", length=2, description="Номер записи в архиве")
-    x20 = Tag(num_byte=0x20, tag="0x20", length=4, description="Дата и время (Unix time)")
-    x21 = Tag(num_byte=0x21, tag="0x21", length=2, description="Миллисекунды")
-    x30 = Tag(num_byte=0x30, tag="0x30", length=9, description="Координаты в градусах, количество спутников, статус координат")
-    x33 = Tag(num_byte=0x33, tag="0x33", length=4, description="Скорость/направление")
-    x34 = Tag(num_byte=0x34, tag="0x34", length=2, description="Высота")
-    x35 = Tag(num_byte=0x35, tag="0x35", length=1, description="HDOP")
-    x40 = Tag(num_byte=0x40, tag="0x40", length=2, description="Статус устройства")
-    x41 = Tag(num_byte=0x41, tag="0x41", length=2, description="Напряжение питания (мВ)")
-    x42 = Tag(num_byte=0x42, tag="0x42", length=2, description="Напряжение АКБ (мВ)")
-    x43 = Tag(num_byte=0x43, tag="0x43", length=1, description="Температура терминала (°C)")
-    x45 = Tag(num_byte=0x45, tag="0x45", length=2, description="Состояние выхода")
-    x46 = Tag(num_byte=0x46, tag="0x46", length=2, description="Сработка на соответсвующем типе")
-    x48 = Tag(num_byte=0x48, tag="0x48", length=2, description="Расширенный статус")
-    x49 = Tag(num_byte=0x49, tag="0x49", length=1, description="Канал передачи")
-    x50 = Tag(num_byte=0x50, tag="0x50", length=2, description="Вход 0 (мВ)")
-    x51 = Tag(num_byte=0x51, tag="0x51", length=2, description="Вход 1 (мВ)")
-    x52 = Tag(num_byte=0x52, tag="0x52", length=2, description="Вход 2 (мВ)")
-    x53 = Tag(num_byte=0x53, tag="0x53", length=2, description="Вход 3 (мВ)")
-    x54 = Tag(num_byte=0x54, tag="0x54", length=2, description="Вход 4 (мВ)")
-    x55 = Tag(num_byte=0x55, tag="0x55", length=2, description="Вход 5 (мВ)")
-    
-    # Теги с переменной длиной или особыми форматами
-    xEA = Tag(num_byte=0xEA, tag="0xEA", length=1, description="Массив данных пользователя (длина указана в следующем байте)")
-    xFE = Tag(num_byte=0xFE, tag="0xFE", length=2, description="Расширенные теги (длина данных указана в следующих байтах)")
-    xD4 = Tag(num_byte=0xD4, tag="0xD4", length=4, description="Общий пробег по GPS (м)")
-    x63 = Tag(num_byte=0x63, tag="0x63", length=3, description="RS485[3] (ДУТ адрес 3)")
-    x70 = Tag(num_byte=0x70, tag="0x70", length=2, description="Идентификатор термометра 0 и измеренная температура, °C")
-    x71 = Tag(num_byte=0x71, tag="0x71", length=2, description="Идентификатор термометра 1 и измеренная температура, °C")
-    x72 = Tag(num_byte=0x71, tag="0x72", length=2, description="Идентификатор термометра 2 и измеренная температура, °C")
-    x73 = Tag(num_byte=0x71, tag="0x73", length=2, description="Идентификатор термометра 3 и измеренная температура, °C")
-    x74 = Tag(num_byte=0x71, tag="0x74", length=2, description="Идентификатор термометра 4 и измеренная температура, °C")
-    x75 = Tag(num_byte=0x71, tag="0x75", length=2, description="Идентификатор термометра 5 и измеренная температура, °C")
-    x76 = Tag(num_byte=0x71, tag="0x75", length=2, description="Идентификатор термометра 5 и измеренная температура, °C")
-    x77 = Tag(num_byte=0x71, tag="0x75", length=2, description="Идентификатор термометра 5 и измеренная температура, °C")
-
-    # Словарь для поиска по байту
-    ALL_TAGS: ClassVar[Dict[int, Tag]] = {
-        0x10: x10, 0x20: x20, 0x21: x21, 0x30: x30, 0x33: x33, 0x34: x34, 0x35: x35,
-        0x40: x40, 0x41: x41, 0x42: x42, 0x43: x43, 0x45: x45, 0x46: x46, 0x48: x48, 0x49: x49,
-        0x50: x50, 0x51: x51, 0x52: x52, 0x53: x53, 0x54: x54, 0x55: x55,
-        0xEA: xEA, 0xFE: xFE, 0xD4: xD4, 0x63: x63,
-        0x70: x70, 0x71: x71, 0x72: x72, 0x73: x73, 0x74: x74, 0x75:x75, 0x76: x76, 0x77: x77
-    }
+    """
+    Таблица тегов протокола, собранная из декларативной схемы при запуске.
+    Добавление тега - изменение tag_schema.json, а не кода.
+    """
+
+    ALL_TAGS: ClassVar[Dict[int, Tag]] = {}
+    BY_METRIC: ClassVar[Dict[str, Tag]] = {}
+    # Подтеги 0xFE: двухбайтовый номер -> Tag
+    EXTENDED: ClassVar[Dict[int, Tag]] = {}
+    # Плоская таблица на 256 элементов: номер тега -> Tag
+    _LOOKUP: ClassVar[List[Optional[Tag]]] = [None] * 256
+    # Имена декодеров из реестра TagDecoder (None - decoders ещё не импортирован)
+    DECODER_KINDS: ClassVar[Optional[FrozenSet[str]]] = None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_SCHEMA_PATH):
+        started = time.perf_counter()
+        schema = load_tag_schema(path)
+
+        tags = compile_tag_entries(schema["tags"])
+        lookup: List[Optional[Tag]] = [None] * 256
+        for num, tag in tags.items():
+            if not 0 <= num <= 0xFF:
+                raise ValueError(f"Tag number {tag.tag_hex_str} does not fit in one byte")
+            lookup[num] = tag
+
+        extended = compile_tag_entries(schema.get("extended", []), hex_width=4)
+        for tag in extended.values():
+            if tag.length_size or tag.decoder in ("mercury", "extended"):
+                raise ValueError(f"Extended tag {tag.tag_hex_str} must have a fixed length and a plain decoder")
+        cls._check_decoders(tags, extended, cls.DECODER_KINDS)
+
+        cls.ALL_TAGS = tags
+        cls.EXTENDED = extended
+        cls.BY_METRIC = {tag.metric: tag for tag in tags.values() if tag.metric}
+        cls._LOOKUP = lookup
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.debug(
+            f"Tag schema {path} compiled: {len(tags)} tags, "
+            f"{len(extended)} extended tags in {elapsed_ms:.2f} ms"
+        )
+
+    @classmethod
+    def register_decoders(cls, kinds: AbstractSet[str]):
+        """
+        Задаёт имена декодеров, которые умеет TagDecoder, и проверяет по ним
+        загруженную схему. Вызывается модулем decoders при импорте: сам модуль
+        tags не может импортировать decoders из-за циклической зависимости.
+
+        :raises ValueError: Если в схеме указан декодер, которого нет в реестре.
+        """
+        cls._check_decoders(cls.ALL_TAGS, cls.EXTENDED, kinds)
+        cls.DECODER_KINDS = frozenset(kinds)
+
+    @staticmethod
+    def _check_decoders(tags: Dict[int, Tag], extended: Dict[int, Tag], kinds: Optional[AbstractSet[str]]):
+        if kinds is None:
+            return
+        for tag in itertools.chain(tags.values(), extended.values()):
+            if tag.decoder not in kinds:
+                raise ValueError(f"Unknown decoder {tag.decoder!r} for tag {tag.tag_hex_str}")
 
     @classmethod
     def get_tag(cls, byte_val: int) -> Optional[Tag]:
-        return cls.ALL_TAGS.get(byte_val)
+        return cls._LOOKUP[byte_val]
+
+    @classmethod
+    def get_extended(cls, num: int) -> Optional[Tag]:
+        return cls.EXTENDED.get(num)
+
+    @classmethod
+    def resolve_extended(cls, names: AbstractSet[str]) -> FrozenSet[int]:
+        """
+        Переводит имена или номера подтегов 0xFE ("rssi", "0x0085") в номера.
+
+        :raises ValueError: Если подтег не найден в схеме.
+        """
+        by_name = {tag.name: num for num, tag in cls.EXTENDED.items()}
+        resolved = set()
+        for name in names:
+            if name in by_name:
+                resolved.add(by_name[name])
+            elif name.lower().startswith("0x") and int(name, 16) in cls.EXTENDED:
+                resolved.add(int(name, 16))
+            else:
+                raise ValueError(f"Unknown extended tag {name!r}")
+        return frozenset(resolved)
+
+
+Tags.load(config.TAG_SCHEMA_PATH or DEFAULT_SCHEMA_PATH)
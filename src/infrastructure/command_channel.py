@@ -0,0 +1,236 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, FrozenSet, List, Optional, Set
+
+from src.domain.commands import build_command_packet
+
+logger = logging.getLogger(__name__)
+
+# Статусы команды
+QUEUED = "queued"
+SENT = "sent"
+DONE = "done"
+TIMEOUT = "timeout"
+FAILED = "failed"
+
+
+class Command:
+    """
+    Команда терминалу и её состояние.
+    """
+
+    def __init__(self, command_id: int, imei: str, text: str, timeout: float):
+        self.id = command_id
+        self.imei = imei
+        self.text = text
+        self.timeout = timeout
+        self.status = QUEUED
+        self.response: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.sent_at: Optional[float] = None
+        self.completed_at: Optional[float] = None
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._timeout_handle: Optional[asyncio.TimerHandle] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "imei": self.imei,
+            "command": self.text,
+            "status": self.status,
+            "response": self.response,
+            "error": self.error,
+            "created_at": self.created_at,
+            "sent_at": self.sent_at,
+            "completed_at": self.completed_at,
+        }
+
+
+class DeviceSession:
+    """
+    Живое TCP-подключение терминала.
+    Все записи в сокет (подтверждения и команды) идут через send().
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter, addr):
+        self.writer = writer
+        self.addr = addr
+        self.imei: Optional[str] = None
+        self.device_id = 0
+        self._write_lock = asyncio.Lock()
+
+    async def send(self, data: bytes):
+        async with self._write_lock:
+            self.writer.write(data)
+            await self.writer.drain()
+
+
+class CommandChannel:
+    """
+    Исходящие команды терминалам поверх их собственных подключений.
+
+    Команды копятся в очереди устройства и уходят пачкой (одна запись
+    в сокет и один drain) как только у устройства есть живая сессия.
+    Ответ терминала сопоставляется по номеру команды (тег 0xE0).
+    """
+
+    # Теги, без которых нельзя привязать сессию к IMEI и разобрать ответ
+    # (resolve() читает только текст ответа 0xE1, двоичные данные 0xEB не нужны)
+    REQUIRED_FIELDS: FrozenSet[str] = frozenset(
+        {"imei", "device_id", "command_number", "command_text"}
+    )
+
+    def __init__(self, batch_size: int = 8, default_timeout: float = 30.0, history_size: int = 1000):
+        self.batch_size = max(1, batch_size)
+        self.default_timeout = default_timeout
+        self.history_size = history_size
+
+        self.sessions: Dict[str, DeviceSession] = {}
+        self._queues: Dict[str, Deque[Command]] = {}
+        self._in_flight: Dict[int, Command] = {}
+        # Последние команды для запросов статуса через API
+        self._history: "OrderedDict[int, Command]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._flush_scheduled: Dict[str, bool] = {}
+        # Ссылки на задачи отправки: цикл событий хранит только слабые ссылки,
+        # а собранная задача оставила бы пачку ни в очереди, ни в _in_flight
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+    def register(self, session: DeviceSession, imei: str, device_id: int = 0):
+        """Привязывает сессию к IMEI и отправляет накопленные команды."""
+        previous = self.sessions.get(imei)
+        if previous is not None and previous is not session:
+            logger.info(f"Device {imei} reconnected from {session.addr}")
+
+        session.imei = imei
+        session.device_id = device_id
+        self.sessions[imei] = session
+
+        if self._queues.get(imei):
+            self._schedule_flush(imei)
+
+    def unregister(self, session: DeviceSession):
+        """Отвязывает закрытую сессию. Неотправленные команды остаются в очереди."""
+        if session.imei is None or self.sessions.get(session.imei) is not session:
+            return
+        del self.sessions[session.imei]
+
+        for command in list(self._in_flight.values()):
+            if command.imei == session.imei:
+                self._complete(command, FAILED, error="connection closed")
+
+    def enqueue(self, imei: str, text: str, timeout: Optional[float] = None) -> Command:
+        """
+        Ставит команду в очередь устройства.
+
+        :raises ValueError: Если команда не помещается в пакет.
+        """
+        # Проверяем формат заранее, чтобы ошибка вернулась вызывающему
+        build_command_packet(imei, 0, 0, text)
+
+        command = Command(next(self._ids) & 0xFFFFFFFF, imei, text,
+                          timeout if timeout is not None else self.default_timeout)
+        self._queues.setdefault(imei, deque()).append(command)
+        self._remember(command)
+
+        if imei in self.sessions:
+            self._schedule_flush(imei)
+        return command
+
+    def get(self, command_id: int) -> Optional[Command]:
+        return self._history.get(command_id)
+
+    def queue_depth(self, imei: str) -> int:
+        return len(self._queues.get(imei, ()))
+
+    def resolve(self, imei: Optional[str], command_number: int, text: Optional[str]):
+        """Сопоставляет ответ терминала с отправленной командой."""
+        command = self._in_flight.get(command_number)
+        if command is None or (imei is not None and command.imei != imei):
+            logger.warning(f"Unexpected response to command {command_number} from {imei}")
+            return
+        command.response = text
+        self._complete(command, DONE)
+
+    def sessions_info(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "imei": imei,
+                "device_id": session.device_id,
+                "address": f"{session.addr[0]}:{session.addr[1]}",
+                "queued": self.queue_depth(imei),
+            }
+            for imei, session in self.sessions.items()
+        ]
+
+    def _schedule_flush(self, imei: str):
+        # Отправка откладывается на следующую итерацию цикла,
+        # чтобы команды, поставленные подряд, ушли одной пачкой
+        if self._flush_scheduled.get(imei):
+            return
+        self._flush_scheduled[imei] = True
+        task = asyncio.get_running_loop().create_task(self._flush(imei))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, imei: str):
+        try:
+            await asyncio.sleep(0)
+            while True:
+                session = self.sessions.get(imei)
+                queue = self._queues.get(imei)
+                if session is None or not queue:
+                    return
+
+                batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+                packets = b"".join(
+                    build_command_packet(imei, session.device_id, command.id, command.text)
+                    for command in batch
+                )
+
+                try:
+                    await session.send(packets)
+                except Exception as e:
+                    # Сессия оборвалась: возвращаем команды в начало очереди
+                    logger.warning(f"Failed to send commands to {imei}: {e}")
+                    queue.extendleft(reversed(batch))
+                    return
+
+                loop = asyncio.get_running_loop()
+                for command in batch:
+                    command.status = SENT
+                    command.sent_at = time.time()
+                    self._in_flight[command.id] = command
+                    command._timeout_handle = loop.call_later(
+                        command.timeout, self._complete, command, TIMEOUT, "no response"
+                    )
+                logger.info(f"Sent {len(batch)} command(s) to {imei}")
+        finally:
+            self._flush_scheduled[imei] = False
+
+    def _complete(self, command: Command, status: str, error: Optional[str] = None):
+        if command.future.done():
+            return
+        if command._timeout_handle is not None:
+            command._timeout_handle.cancel()
+        self._in_flight.pop(command.id, None)
+
+        command.status = status
+        command.error = error
+        command.completed_at = time.time()
+        command.future.set_result(command)
+
+    def _remember(self, command: Command):
+        self._history[command.id] = command
+        while len(self._history) > self.history_size:
+            _, old = self._history.popitem(last=False)
+            if not old.future.done() and old.status == QUEUED:
+                # Очередь не должна расти бесконечно для устройств, которые не выходят на связь
+                queue = self._queues.get(old.imei)
+                if queue and old in queue:
+                    queue.remove(old)
+                self._complete(old, FAILED, error="evicted from queue")
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from src.domain.device_state import DeviceStateStore, Geofence
+from src.infrastructure.command_channel import CommandChannel
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class ControlApi:
+    """
+    Локальный HTTP API управления: очередь команд, последнее состояние
+    устройств и геозоны.
+
+    POST   /commands          {"imei": "...", "command": "...", "timeout": 30, "wait": false}
+    GET    /commands/<id>     состояние команды
+    GET    /sessions          устройства на связи и глубина их очередей
+    GET    /devices/<imei>    последнее состояние устройства
+    GET    /devices?bbox=min_lat,min_lon,max_lat,max_lon
+    GET    /devices?lat=..&lon=..&radius=..   (радиус в метрах)
+    GET    /geofences         геозоны; POST - добавить {"name", "lat", "lon", "radius_m"} или {"name", "bbox"}
+    DELETE /geofences/<name>
+    GET    /geofences/events  последние события входа/выхода
+    """
+
+    def __init__(self, channel: CommandChannel, host: str, port: int,
+                 states: Optional[DeviceStateStore] = None):
+        self.channel = channel
+        self.states = states
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_request, self.host, self.port)
+        logger.info(f"Control API started on {self.host}:{self.port}")
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, path, body = await self._read_request(reader)
+            status, payload = await self._route(method, path, body)
+        except (ValueError, KeyError, TypeError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Control API error: {e}", exc_info=True)
+            status, payload = 500, {"error": "internal error"}
+
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n"
+        )
+        try:
+            writer.write(head.encode("ascii") + data)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ValueError("Malformed request line")
+        method, path, _ = parts
+
+        content_length = 0
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                content_length = int(value.strip())
+
+        if content_length > MAX_BODY_SIZE:
+            raise ValueError("Request body is too large")
+        body = await reader.readexactly(content_length) if content_length else b""
+        return method.upper(), path, body
+
+    async def _route(self, method: str, target: str, body: bytes) -> Tuple[int, Any]:
+        url = urlsplit(target)
+        path = url.path
+
+        if self.states is not None and (path.startswith("/devices") or path.startswith("/geofences")):
+            return self._route_states(method, path, parse_qs(url.query), body)
+
+        if path == "/commands":
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            return await self._enqueue(json.loads(body or b"{}"))
+
+        if path.startswith("/commands/"):
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            command = self.channel.get(int(path.rsplit("/", 1)[1]))
+            if command is None:
+                return 404, {"error": "command not found"}
+            return 200, command.to_dict()
+
+        if path == "/sessions" and method == "GET":
+            return 200, self.channel.sessions_info()
+
+        return 404, {"error": "not found"}
+
+    async def _enqueue(self, request: Dict[str, Any]) -> Tuple[int, Any]:
+        imei = str(request.get("imei", ""))
+        text = request.get("command")
+        if not imei or not text:
+            raise ValueError("imei and command are required")
+
+        timeout = request.get("timeout")
+        command = self.channel.enqueue(imei, str(text), float(timeout) if timeout is not None else None)
+
+        if request.get("wait"):
+            # Устройство на связи - команда уйдёт сразу и ответ придёт в пределах таймаута;
+            # иначе возвращаем 202 со статусом queued
+            try:
+                await asyncio.wait_for(asyncio.shield(command.future), timeout=command.timeout)
+            except asyncio.TimeoutError:
+                return 202, command.to_dict()
+            return 200, command.to_dict()
+        return 202, command.to_dict()
+
+    def _route_states(self, method: str, path: str, query: Dict[str, list], body: bytes) -> Tuple[int, Any]:
+        if path == "/devices":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            if "bbox" in query:
+                min_lat, min_lon, max_lat, max_lon = (float(v) for v in query["bbox"][0].split(","))
+                return 200, [state.to_dict() for state in self.states.within_bbox(min_lat, min_lon, max_lat, max_lon)]
+            if {"lat", "lon", "radius"} <= query.keys():
+                found = self.states.within_radius(
+                    float(query["lat"][0]), float(query["lon"][0]), float(query["radius"][0])
+                )
+                return 200, [{**state.to_dict(), "distance_m": round(distance, 1)} for distance, state in found]
+            raise ValueError("bbox or lat/lon/radius query is required")
+
+        if path.startswith("/devices/"):
+            state = self.states.get(unquote(path[len("/devices/"):]))
+            if state is None:
+                return 404, {"error": "device not found"}
+            return 200, state.to_dict()
+
+        if path == "/geofences":
+            if method == "GET":
+                return 200, [fence.to_dict() for fence in self.states.geofences.values()]
+            if method == "POST":
+                fence = Geofence.from_dict(json.loads(body or b"{}"))
+                self.states.add_geofence(fence)
+                return 201, fence.to_dict()
+            return 405, {"error": "use GET or POST"}
+
+        if path == "/geofences/events":
+            return 200, list(self.states.events)
+
+        if path.startswith("/geofences/"):
+            if method != "DELETE":
+                return 405, {"error": "use DELETE"}
+            if not self.states.remove_geofence(unquote(path[len("/geofences/"):])):
+                return 404, {"error": "geofence not found"}
+            return 200, {"deleted": True}
+
+        return 404, {"error": "not found"}
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable, Optional, Tuple
+
+from src.domain.rate_limit import TokenBucket
+from src.infrastructure.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class IngestScheduler:
+    """
+    Очередность обработки кадров между разбором потока и декодированием.
+
+    Каждый кадр обрабатывается внутри slot(). Слоты выдаёт один диспетчер.
+    - Не больше max_in_flight кадров обрабатываются одновременно.
+    - Живые кадры (старший бит длины сброшен) получают слот раньше архивных.
+    - Архивные кадры ограничены корзиной токенов устройства (archive_rate
+      кадров в секунду, запас archive_burst) и выдаются по кругу между
+      устройствами. Устройство - IMEI сессии (до привязки - сама сессия),
+      поэтому переподключение не даёт новый полный запас. Корзина удаляется,
+      если не использовалась bucket_idle секунд (не раньше, чем успела бы
+      наполниться), а не при закрытии подключения.
+    - После batch_size выданных слотов диспетчер уступает цикл событий.
+    Пока устройство ждёт слот, его подключение не читается, так что
+    выгрузка архива замедляется через TCP, а не копится в памяти.
+    """
+
+    def __init__(self, archive_rate: float = 20.0, archive_burst: float = 40.0,
+                 batch_size: int = 32, max_in_flight: int = 64, bucket_idle: float = 600.0):
+        self.archive_rate = archive_rate
+        self.archive_burst = archive_burst
+        # Раньше, чем корзина наполнится, удалять нельзя: новая корзина была бы полнее
+        self.bucket_idle = max(bucket_idle, archive_burst / archive_rate if archive_rate > 0 else 0.0)
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+
+        self._live: Deque[Tuple[Hashable, asyncio.Future]] = deque()
+        self._archive: Dict[Hashable, Deque[asyncio.Future]] = {}
+        self._archive_order: Deque[Hashable] = deque()
+        # Порядок - от давно не использованных к недавним
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._labels: Dict[Hashable, str] = {}
+        self.depths: Dict[Hashable, int] = {}
+        self._in_flight = 0
+
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def slot(self, device: Hashable, archive: bool):
+        """
+        Ждёт очереди на обработку одного кадра устройства.
+
+        :param device: Ключ устройства для очереди и корзины архивных кадров
+            (IMEI, если сессия уже привязана, иначе сессия).
+        """
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        if archive and self.archive_rate > 0:
+            if device not in self._archive:
+                self._archive[device] = deque()
+                self._archive_order.append(device)
+            self._archive[device].append(future)
+        else:
+            self._live.append((device, future))
+        self._wakeup.set()
+
+        queued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Слот мог быть выдан уже после отмены ожидания
+            if future.done() and not future.cancelled():
+                self._release()
+            else:
+                future.cancel()
+            raise
+        metrics.ingest_wait.labels(kind="archive" if archive else "live").observe(time.monotonic() - queued_at)
+
+        try:
+            yield
+        finally:
+            self._release()
+
+    def set_depth(self, device: Hashable, depth: int, imei: Optional[str] = None):
+        """Запоминает число кадров устройства, ожидающих обработки."""
+        self.depths[device] = depth
+        if imei is not None:
+            self._labels[device] = imei
+            metrics.ingest_queue_depth.labels(imei=imei).set(depth)
+
+    def forget(self, device: Hashable):
+        """
+        Освобождает состояние закрытого подключения. Корзина токенов остаётся
+        до простоя bucket_idle: устройство может сразу переподключиться.
+        """
+        self.depths.pop(device, None)
+        imei = self._labels.pop(device, None)
+        if imei is not None and imei not in self._labels.values():
+            try:
+                metrics.ingest_queue_depth.remove(imei)
+            except KeyError:
+                pass
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            granted = 0
+            retry_in: Optional[float] = None
+            while self._in_flight < self.max_in_flight and granted < self.batch_size:
+                future, retry_in = self._next()
+                if future is None:
+                    break
+                future.set_result(None)
+                self._in_flight += 1
+                granted += 1
+
+            if granted >= self.batch_size:
+                # Уступаем цикл событий: кадры обрабатываются в задачах подключений
+                await asyncio.sleep(0)
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=retry_in)
+            except asyncio.TimeoutError:
+                pass
+
+    def _next(self) -> Tuple[Optional[asyncio.Future], Optional[float]]:
+        """
+        :return: Следующий ожидающий слот и, если архивные кадры ждут токенов,
+            через сколько секунд появится ближайший токен.
+        """
+        while self._live:
+            _, future = self._live.popleft()
+            if not future.done():
+                return future, None
+
+        now = time.monotonic()
+        retry_in: Optional[float] = None
+        for _ in range(len(self._archive_order)):
+            device = self._archive_order[0]
+            self._archive_order.rotate(-1)
+            waiters = self._archive[device]
+            while waiters and waiters[0].done():
+                waiters.popleft()
+            if not waiters:
+                del self._archive[device]
+                self._archive_order.pop()
+                continue
+
+            bucket = self._bucket(device, now)
+            if bucket.take(now):
+                future = waiters.popleft()
+                if not waiters:
+                    del self._archive[device]
+                    self._archive_order.pop()
+                return future, None
+
+            wait = bucket.wait_time(now)
+            retry_in = wait if retry_in is None else min(retry_in, wait)
+        return None, retry_in
+
+    def _bucket(self, device: Hashable, now: float) -> TokenBucket:
+        bucket = self._buckets.get(device)
+        if bucket is not None:
+            self._buckets.move_to_end(device)
+            return bucket
+
+        # Корзины создаются только здесь, поэтому простаивающие удаляются тут же
+        while self._buckets:
+            oldest = next(iter(self._buckets.values()))
+            if now - oldest.updated < self.bucket_idle:
+                break
+            self._buckets.popitem(last=False)
+        bucket = self._buckets[device] = TokenBucket(self.archive_rate, self.archive_burst, now)
+        return bucket
@@ -1,12 +1,24 @@
 import asyncio
+import json
 import logging
+import socket
 import struct
-from typing import Dict, Any, Optional
+from collections import deque
+from typing import Deque, Dict, Any, List, Optional, Set
 from src.domain.parser import TagParser
 from src.domain.decoders import TagDecoder
-from src.domain.models import ParsedPacket
+from src.domain.models import ParsedPacket, ParsedTag
+from src.domain.framing import FrameSplitter
+from src.domain.projection import FieldProjection
+from src.domain.dedup import RecordDeduplicator
+from src.domain.device_state import DeviceStateStore, Geofence
 from src.config import config
 from src.infrastructure.storage import JsonFileStorage
+from src.infrastructure.command_channel import CommandChannel, DeviceSession
+from src.infrastructure.ingest_scheduler import IngestScheduler
+from src.infrastructure.logging_setup import LogSampler, ResyncReporter
+from src.infrastructure.metrics import metrics
+from src.infrastructure.remote_write import RemoteWriteExporter
 import aiofiles
 from datetime import datetime
 
@@ -22,126 +34,323 @@ class GalileoskyListenerAdapter:
         self.host = host
         self.port = port
         self.server: Optional[asyncio.AbstractServer] = None
-        self.storage = JsonFileStorage() # Инициализация хранилища
+        # Задачи подключений и те из них, что сейчас ждут данных из сокета
+        self._clients: Set[asyncio.Task] = set()
+        self._reading: Set[asyncio.Task] = set()
+        self._stopping = False
+        self._stopped = asyncio.Event()
+        self.storage = JsonFileStorage(exporter=self._build_exporter()) # Инициализация хранилища
         self.raw_log_path = "raw_data.log" # Файл для сырых данных
+        self.commands = CommandChannel(config.COMMAND_BATCH_SIZE, config.COMMAND_TIMEOUT)
+        self.dedup = RecordDeduplicator(config.DEDUP_WINDOW, config.DEDUP_MAX_DEVICES)
+        self.scheduler = IngestScheduler(
+            config.INGEST_ARCHIVE_RATE, config.INGEST_ARCHIVE_BURST,
+            config.INGEST_BATCH_SIZE, config.INGEST_MAX_IN_FLIGHT, config.INGEST_BUCKET_IDLE,
+        )
+        self.states = DeviceStateStore(
+            config.STATE_CELL_DEG, self._load_geofences(), max_fence_cells=config.GEOFENCE_MAX_CELLS,
+        )
+        # Сообщения на каждый пакет - не чаще раза в LOG_SAMPLE_INTERVAL на устройство
+        self.packet_log = LogSampler(config.LOG_SAMPLE_INTERVAL)
+        self.error_log = LogSampler(config.LOG_SAMPLE_INTERVAL, burst=3)
+        self.resync = ResyncReporter(config.LOG_SUMMARY_INTERVAL, log=logger)
+        self.projection = self._build_projection()
+        self.parser = TagParser(config.MAX_SKIPPED_BYTES, config.PARSE_TIME_BUDGET, config.MAX_SKIPPED_RATIO)
 
-    async def start(self):
-        """Запуск TCP сервера."""
-        self.server = await asyncio.start_server(
-            self.handle_client, self.host, self.port
+    @staticmethod
+    def _build_exporter() -> Optional[RemoteWriteExporter]:
+        if not config.REMOTE_WRITE_URL:
+            return None
+        logger.info(f"Samples will be pushed to {config.REMOTE_WRITE_URL}")
+        return RemoteWriteExporter(
+            config.REMOTE_WRITE_URL,
+            batch_size=config.REMOTE_WRITE_BATCH_SIZE,
+            flush_interval=config.REMOTE_WRITE_FLUSH_INTERVAL,
+            spool_dir=config.REMOTE_WRITE_SPOOL_DIR,
+            spool_max_bytes=config.REMOTE_WRITE_SPOOL_MAX_BYTES,
         )
+
+    @staticmethod
+    def _load_geofences() -> List[Geofence]:
+        if not config.GEOFENCES_PATH:
+            return []
+        with open(config.GEOFENCES_PATH, encoding="utf-8") as f:
+            geofences = [Geofence.from_dict(entry) for entry in json.load(f)]
+        logger.info(f"Loaded {len(geofences)} geofence(s) from {config.GEOFENCES_PATH}")
+        return geofences
+
+    def _build_projection(self) -> Optional[FieldProjection]:
+        """
+        Собирает проекцию полей из потребностей активных потребителей данных.
+        None - парсить и декодировать все теги.
+        """
+        mode = config.FIELD_PROJECTION.strip()
+        extended = [name.strip() for name in config.EXTENDED_TAGS.split(",") if name.strip()]
+
+        if mode == "all":
+            fields = None
+        elif mode == "auto":
+            fields = self.storage.required_fields
+            if fields is not None:
+                fields = (fields | self.commands.REQUIRED_FIELDS | self.dedup.REQUIRED_FIELDS
+                          | self.states.REQUIRED_FIELDS)
+        else:
+            fields = [name.strip() for name in mode.split(",") if name.strip()]
+
+        if fields is None:
+            if not extended:
+                return None
+            return FieldProjection(tags=None, extended=FieldProjection.from_fields(extended).extended)
+
+        projection = FieldProjection.from_fields(list(fields) + extended)
+        logger.info(f"Field projection: {len(projection.tags)} tags")
+        return projection
+
+    async def start(self, sock: Optional[socket.socket] = None):
+        """
+        Запуск TCP сервера. Работает до вызова shutdown().
+
+        :param sock: Уже слушающий сокет (передан предыдущим процессом при перезапуске).
+        """
+        if sock is not None:
+            self.server = await asyncio.start_server(self.handle_client, sock=sock)
+        else:
+            self.server = await asyncio.start_server(
+                self.handle_client, self.host, self.port
+            )
         addr = self.server.sockets[0].getsockname()
         logger.info(f"Galileosky Listener started on {addr}")
         logger.info(f"Data will be saved to {self.storage.file_path}")
         logger.info(f"Raw data will be logged to {self.raw_log_path}")
         
-        async with self.server:
-            await self.server.serve_forever()
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.storage.close()
+
+    def listen_fd(self) -> int:
+        """Дескриптор слушающего сокета для передачи новому процессу."""
+        return self.server.sockets[0].fileno()
+
+    async def shutdown(self, drain_timeout: float = 30.0):
+        """
+        Плавная остановка: новые подключения не принимаются, уже полученные
+        кадры обрабатываются и подтверждаются, затем подключения закрываются,
+        а start() сбрасывает хранилище. Неподтверждённые данные терминал
+        перешлёт после переподключения.
+        """
+        if self._stopping:
+            return
+        self._stopping = True
+        if self.server is not None:
+            self.server.close()
+
+        # Подключения, ждущие данных, закрываются сразу; занятые - после своих кадров
+        for task in list(self._reading):
+            task.cancel()
+        if self._clients:
+            logger.info(f"Draining {len(self._clients)} connection(s)")
+            _, pending = await asyncio.wait(set(self._clients), timeout=drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"{len(pending)} connection(s) did not drain in {drain_timeout}s")
+                await asyncio.wait(pending)
+        self._stopped.set()
 
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
         """Обработка подключения клиента."""
         addr = writer.get_extra_info('peername')
-        logger.info(f"New connection from {addr}")
+        logger.info("New connection from %s", addr)
+        session = DeviceSession(writer, addr)
+        task = asyncio.current_task()
+        self._clients.add(task)
         
-        buffer = b''
+        splitter = FrameSplitter(config.MAX_FRAME_LENGTH)
+        frames: Deque[bytes] = deque()
         
         try:
-            while True:
+            while not self._stopping:
+                self._reading.add(task)
                 try:
                     chunk = await asyncio.wait_for(reader.read(1024), timeout=config.TIMEOUT)
                 except asyncio.TimeoutError:
                     logger.warning(f"Timeout from {addr}")
                     break
+                finally:
+                    self._reading.discard(task)
                     
                 if not chunk:
                     break
                 
-                buffer += chunk
-                
-                # Обработка буфера
-                while len(buffer) > 3: # Min size: Header(1) + Len(2)
-                    if buffer[0] != 0x01:
-                        logger.warning(f"Garbage data detected from {addr}, skipping byte {hex(buffer[0])}")
-                        buffer = buffer[1:]
-                        continue
-                        
-                    # Парсинг длины (Little Endian)
-                    len_field = struct.unpack('<H', buffer[1:3])[0]
-                    length = len_field & 0x7FFF
-                    
-                    expected_len = 1 + 2 + length + 2 # Header + Len + Data + CRC
-                    
-                    if len(buffer) < expected_len:
-                        break
-                        
-                    # Извлечение пакета
-                    packet_data = buffer[:expected_len]
-                    
-                    # Логирование сырых данных
-                    try:
-                        hex_data = packet_data.hex().upper()
-                        timestamp = datetime.now().isoformat()
-                        log_entry = f"{timestamp} | {addr[0]}:{addr[1]} | {hex_data}\n"
-                        
-                        async with aiofiles.open(self.raw_log_path, mode='a') as f:
-                            await f.write(log_entry)
-                    except Exception as e:
-                        logger.error(f"Failed to log raw data: {e}")
-
-                    # Данные тегов (без заголовка, длины и CRC)
-                    tags_data = packet_data[3:-2] 
-                    buffer = buffer[expected_len:]
-                    
-                    try:
-                        # 1. Парсинг структуры тегов
-                        # TagParser ожидает List[int], преобразуем bytes -> list
-                        byte_list = list(tags_data)
-                        parser = TagParser()
-                        parsed_packet: ParsedPacket = parser.parse(byte_list)
-                        
-                        await self.process_parsed_data(addr, parsed_packet)
-                        
-                        # 2. Отправка подтверждения
-                        received_crc = struct.unpack('<H', packet_data[-2:])[0]
-                        response = b'\x02' + struct.pack('<H', received_crc)
-                        
-                        writer.write(response)
-                        await writer.drain()
-                        logger.debug(f"Sent confirmation to {addr}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing packet from {addr}: {e}", exc_info=True)
+                skipped, oversized = splitter.skipped, splitter.oversized
+                frames.extend(splitter.feed(chunk))
+                skipped = splitter.skipped - skipped
+                if splitter.oversized > oversized:
+                    metrics.rejected_input.labels(reason="oversized_frame").inc(splitter.oversized - oversized)
+                if skipped:
+                    metrics.garbage_bytes.inc(skipped)
+
+                # Мусорные байты попадают в периодическую сводку, а не в лог по одному
+                self.resync.record(session.imei or f"{addr[0]}:{addr[1]}", skipped)
+
+                # Обработка кадров в очередь планировщика: следующий кусок
+                # не читается, пока не обработаны уже полученные кадры
+                while frames:
+                    self.scheduler.set_depth(session, len(frames), session.imei)
+                    packet_data = frames.popleft()
+                    # Старший бит длины: в архиве терминала есть неотправленные записи
+                    archive = bool(packet_data[2] & 0x80)
+                    async with self.scheduler.slot(session.imei or session, archive):
+                        await self.process_frame(addr, packet_data, session)
+                self.scheduler.set_depth(session, 0, session.imei)
                         
+        except asyncio.CancelledError:
+            # Остановка сервиса: неполный кадр не подтверждён, терминал пришлёт его снова
+            pass
         except Exception as e:
-            logger.error(f"Connection error with {addr}: {e}")
+            logger.error("Connection error with %s: %s", addr, e)
         finally:
-            logger.info(f"Connection closed {addr}")
+            logger.info("Connection closed %s", addr)
+            self._clients.discard(task)
+            self.packet_log.forget(session)
+            self.error_log.forget(session)
+            self.commands.unregister(session)
+            self.scheduler.forget(session)
             writer.close()
-            await writer.wait_closed()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
 
-    async def process_parsed_data(self, addr, packet: ParsedPacket):
+    async def process_frame(self, addr, packet_data: bytes, session: DeviceSession):
+        """Разбор одного кадра, обработка данных и подтверждение."""
+        # Логирование сырых данных
+        try:
+            hex_data = packet_data.hex().upper()
+            timestamp = datetime.now().isoformat()
+            log_entry = f"{timestamp} | {addr[0]}:{addr[1]} | {hex_data}\n"
+            
+            async with aiofiles.open(self.raw_log_path, mode='a') as f:
+                await f.write(log_entry)
+        except Exception as e:
+            logger.error(f"Failed to log raw data: {e}")
+
+        # Данные тегов (без заголовка, длины и CRC)
+        tags_data = packet_data[3:-2] 
+        
+        try:
+            # 1. Парсинг структуры тегов
+            # TagParser ожидает List[int], преобразуем bytes -> list
+            byte_list = list(tags_data)
+            parsed_packet: ParsedPacket = self.parser.parse(byte_list, self.projection)
+            if parsed_packet.truncated is not None:
+                metrics.rejected_input.labels(reason=parsed_packet.truncated).inc()
+                if self.error_log.allow(session) is not None:
+                    logger.warning("Packet from %s parsed partially (%s): %d tag(s), %d byte(s) skipped",
+                                   addr, parsed_packet.truncated, len(parsed_packet.tags), parsed_packet.skipped_bytes)
+            
+            await self.process_parsed_data(addr, parsed_packet, session)
+            if parsed_packet.truncated is not None:
+                # Пакет подтверждается (иначе терминал присылал бы его бесконечно),
+                # поэтому сырые данные сохраняются в хранилище ошибок для повторного разбора
+                await self.storage.save_rejected({
+                    "error": f"Packet parsed partially: {parsed_packet.truncated}",
+                    "imei": session.imei,
+                    "source_ip": addr[0],
+                    "source_port": addr[1],
+                    "skipped_bytes": parsed_packet.skipped_bytes,
+                    "raw_data": packet_data.hex().upper(),
+                })
+            
+            # 2. Отправка подтверждения
+            received_crc = struct.unpack('<H', packet_data[-2:])[0]
+            response = b'\x02' + struct.pack('<H', received_crc)
+            
+            await session.send(response)
+            logger.debug("Sent confirmation to %s", addr)
+            
+        except Exception as e:
+            if self.error_log.allow(session) is not None:
+                logger.error("Error processing packet from %s: %s", addr, e, exc_info=True)
+
+    async def process_parsed_data(self, addr, packet: ParsedPacket, session: Optional[DeviceSession] = None):
         """
         Обработка распарсенных данных (декодирование и логирование/сохранение).
         """
-        logger.info(f"Received packet from {addr} with {len(packet.tags)} tags")
-        
-        packet_dict = {
-            "source_ip": addr[0],
-            "source_port": addr[1],
-            "tags": {}
-        }
+        if logger.isEnabledFor(logging.INFO):
+            suppressed = self.packet_log.allow(session or addr)
+            if suppressed is not None:
+                logger.info("Received packet from %s with %d tags (%d more since last report)",
+                            addr, len(packet.tags), suppressed)
+
+        if session is not None:
+            self._bind_session(session, packet)
+
+        # Повторно присланные записи отбрасываются до декодирования (подтверждение всё равно уходит)
+        imei = session.imei if session is not None else None
+        device = imei or f"{addr[0]}:{addr[1]}"
+        record_keys = self.dedup.record_keys(packet)
+        seen = self.dedup.check(device, record_keys)
+        if seen:
+            metrics.duplicate_records.labels(imei=imei or "unknown").inc(len(seen))
+            if len(seen) == len(set(record_keys)):
+                metrics.duplicate_packets.labels(imei=imei or "unknown").inc()
+                logger.debug("Dropped duplicate packet from %s: %d record(s)", imei or addr, len(record_keys))
+                return
+            packet = self.dedup.drop_records(packet, seen)
         
-        for tag in packet.tags:
-            try:
-                decoded_value = TagDecoder.decode(tag.tag.num, tag.data)
-                tag_key = tag.tag.tag_hex_str # e.g. "0x10"
-                packet_dict["tags"][tag_key] = decoded_value
-                
-                # if config.DEBUG:
-                #     logger.debug(f"  Tag {tag.tag.tag_hex_str}: {decoded_value}")
+        # Архивный пакет содержит несколько записей: каждая сохраняется отдельно
+        # со своими 0x20/0xEA, теги заголовка (IMEI и т.п.) добавляются к каждой
+        records = [self._decode_tags(tags, addr, session) for _, tags in self.dedup.split_records(packet)]
+        header: Dict[str, Any] = {}
+        if len(records) > 1 and "0x10" not in records[0] and "0x20" not in records[0]:
+            header = records.pop(0)
+
+        for record_tags in records:
+            tags = {**header, **record_tags}
+            packet_dict = {
+                "source_ip": addr[0],
+                "source_port": addr[1],
+                "imei": imei,
+                "tags": tags,
+            }
+
+            command_number = tags.get("0xE0")
+            if session is not None and isinstance(command_number, int):
+                self.commands.resolve(session.imei, command_number, tags.get("0xE1"))
+
+            if imei is not None:
+                for event in self.states.update(imei, tags):
+                    logger.info("Device %s %s geofence %s", imei, event["event"], event["geofence"])
+
+            # Сохранение в хранилище
+            await self.storage.save(packet_dict)
+        # Записи считаются принятыми только после сохранения
+        self.dedup.commit(device, record_keys)
 
+    def _decode_tags(self, tags: List[ParsedTag], addr, session: Optional[DeviceSession]) -> Dict[str, Any]:
+        """Декодирует теги одной записи в словарь "0x10" -> значение."""
+        decoded: Dict[str, Any] = {}
+        extended_fields = self.projection.extended if self.projection else None
+
+        for tag in tags:
+            try:
+                decoded[tag.tag.tag_hex_str] = TagDecoder.decode(tag.tag.num, tag.data, extended_fields)
             except Exception as e:
-                logger.error(f"Failed to decode tag {tag.tag.tag_hex_str}: {e}")
-                
-        # Сохранение в хранилище
-        await self.storage.save(packet_dict)
+                if self.error_log.allow(session or addr) is not None:
+                    logger.error("Failed to decode tag %s from %s: %s", tag.tag.tag_hex_str, addr, e)
+        return decoded
+
+    def _bind_session(self, session: DeviceSession, packet: ParsedPacket):
+        """
+        Привязывает сессию к IMEI (тег 0x03 приходит в первом пакете).
+        """
+        tags = {tag.tag.num: tag for tag in packet.tags if tag.tag.num in (0x03, 0x04)}
+        if 0x03 not in tags:
+            return
+
+        imei = TagDecoder.decode(0x03, tags[0x03].data)
+        if imei != session.imei:
+            device_id = TagDecoder.decode(0x04, tags[0x04].data) if 0x04 in tags else 0
+            self.commands.register(session, imei, device_id if isinstance(device_id, int) else 0)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import queue
+import sys
+import time
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Hashable, Optional
+
+from src.domain.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Передаёт записи в очередь для потока QueueListener.
+
+    Записи не форматируются в вызывающем потоке: очередь внутрипроцессная,
+    поэтому сообщение и трассировка собираются уже в потоке вывода.
+    При переполнении очереди записи отбрасываются, а не блокируют цикл событий.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: int, queue_size: int = 10000) -> QueueListener:
+    """
+    Настраивает корневой логгер на вывод в stdout через отдельный поток.
+
+    :return: Запущенный QueueListener; stop() дописывает очередь до конца.
+    """
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=queue_size)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(DroppingQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class LogSampler:
+    """
+    Ограничение частоты сообщений по ключу (устройству): не больше одного
+    сообщения в interval секунд с запасом burst. Число ключей ограничено,
+    давно не встречавшиеся вытесняются.
+    """
+
+    def __init__(self, interval: float = 10.0, burst: int = 1, max_keys: int = 10000):
+        self.rate = 1.0 / interval if interval > 0 else 0.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self._suppressed: Dict[Hashable, int] = {}
+
+    def allow(self, key: Hashable) -> Optional[int]:
+        """
+        :return: None, если сообщение надо пропустить, иначе число
+            пропущенных по этому ключу с прошлого разрешённого сообщения.
+        """
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                old_key, _ = self._buckets.popitem(last=False)
+                self._suppressed.pop(old_key, None)
+        else:
+            self._buckets.move_to_end(key)
+
+        if bucket.take(now):
+            return self._suppressed.pop(key, 0)
+        self._suppressed[key] = self._suppressed.get(key, 0) + 1
+        return None
+
+    def forget(self, key: Hashable):
+        self._buckets.pop(key, None)
+        self._suppressed.pop(key, None)
+
+
+class ResyncReporter:
+    """
+    Сводка по мусорным байтам вместо предупреждения на каждый байт:
+    раз в interval секунд пишет, сколько байт и от каких источников пропущено.
+    """
+
+    def __init__(self, interval: float = 60.0, top: int = 5, log: logging.Logger = logger):
+        self.interval = interval
+        self.top = top
+        self.log = log
+        self._skipped: Dict[str, int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def record(self, source: str, count: int):
+        if count <= 0:
+            return
+        self._skipped[source] = self._skipped.get(source, 0) + count
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.interval, self.report)
+
+    def report(self):
+        """Пишет сводку за прошедший период и начинает новый."""
+        self._timer = None
+        if not self._skipped:
+            return
+        skipped, self._skipped = self._skipped, {}
+        worst = sorted(skipped.items(), key=lambda item: item[1], reverse=True)[:self.top]
+        self.log.warning(
+            "Skipped %d garbage byte(s) from %d source(s) in the last %gs, top: %s",
+            sum(skipped.values()), len(skipped), self.interval,
+            ", ".join(f"{source}={count}" for source, count in worst),
+        )
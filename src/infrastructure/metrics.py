@@ -1,4 +1,4 @@
-from prometheus_client import Gauge, Counter
+from prometheus_client import Gauge, Counter, Histogram
 
 class MercuryMetrics:
     def __init__(self):
@@ -38,6 +38,43 @@ class MercuryMetrics:
         # Distortion (Phase 1, 2, 3)
         self.mercury_distortion = Gauge('galileosky_mercury_distortion', 'Harmonic distortion', self.labels + ['phase'])
 
+        # Archive records resent by terminals and dropped before decoding
+        self.duplicate_records = Counter('galileosky_duplicate_records_dropped', 'Duplicate archive records dropped', ['imei'])
+        self.duplicate_packets = Counter('galileosky_duplicate_packets_dropped', 'Packets dropped because all their records were duplicates', ['imei'])
+
+        # Input rejected by ingest limits and bytes skipped while resyncing framing
+        self.rejected_input = Counter('galileosky_rejected_input', 'Input rejected by ingest limits', ['reason'])
+        self.garbage_bytes = Counter('galileosky_garbage_bytes', 'Bytes skipped while resyncing framing')
+
+        # Ingest scheduling: frames waiting per device and time spent waiting for a slot
+        self.ingest_queue_depth = Gauge('galileosky_ingest_queue_depth', 'Frames buffered per device awaiting processing', ['imei'])
+        self.ingest_wait = Histogram('galileosky_ingest_wait_seconds', 'Time a frame waited for a processing slot', ['kind'],
+                                     buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+        # (data key, metric name, gauge, extra labels) for every series fed from a parsed record
+        self.series = []
+        for i in range(4):
+            self.series.append((f"enter{i}", 'galileosky_enter_voltage', self.enter_voltage, {'input_id': str(i)}))
+        for i in range(8):
+            self.series.append((f"galileosky_temp{i}", 'galileosky_temperature', self.temperature, {'sensor_id': str(i)}))
+        self.series.append(("galileosky_mercury_state", 'galileosky_mercury_status', self.mercury_status, {}))
+        self.series.append(("galileosky_mercury_f", 'galileosky_mercury_frequency', self.mercury_frequency, {}))
+        for i in range(1, 4):
+            self.series.append((f"galileosky_mercury_u{i}", 'galileosky_mercury_voltage', self.mercury_voltage, {'phase': str(i)}))
+        for i in range(1, 4):
+            self.series.append((f"galileosky_mercury_i{i}", 'galileosky_mercury_current', self.mercury_current, {'phase': str(i)}))
+        for key, pair in (("galileosky_mercury_a12", "1-2"), ("galileosky_mercury_a23", "2-3"), ("galileosky_mercury_a13", "1-3")):
+            self.series.append((key, 'galileosky_mercury_angle', self.mercury_angle, {'phase_pair': pair}))
+        for key, phase in (("galileosky_mercury_p1", "1"), ("galileosky_mercury_p2", "2"),
+                           ("galileosky_mercury_p3", "3"), ("galileosky_mercury_ps", "sum")):
+            self.series.append((key, 'galileosky_mercury_active_power', self.mercury_active_power, {'phase': phase}))
+        self.series.append(("galileosky_mercury_pa_plus", 'galileosky_mercury_active_energy_fwd', self.mercury_active_energy_fwd, {}))
+        for key, phase in (("galileosky_mercury_ks1", "1"), ("galileosky_mercury_ks2", "2"),
+                           ("galileosky_mercury_ks3", "3"), ("galileosky_mercury_kss", "sum")):
+            self.series.append((key, 'galileosky_mercury_power_factor', self.mercury_power_factor, {'phase': phase}))
+        for i in range(1, 4):
+            self.series.append((f"galileosky_mercury_kg{i}", 'galileosky_mercury_distortion', self.mercury_distortion, {'phase': str(i)}))
+
     def update(self, imei: str, mercury_id: str, data: dict):
         """
         Update metrics with data from the parsed packet.
@@ -47,75 +84,21 @@ class MercuryMetrics:
         """
         common_labels = {'imei': imei, 'mercury_id': mercury_id}
 
-        # Enters
-        for i in range(4):
-            key = f"enter{i}"
-            if key in data:
-                self.enter_voltage.labels(**common_labels, input_id=str(i)).set(data[key])
-
-        # Temperatures
-        for i in range(8):
-            key = f"galileosky_temp{i}"
-            if key in data:
-                self.temperature.labels(**common_labels, sensor_id=str(i)).set(data[key])
-
-        # Mercury Status
-        if "galileosky_mercury_state" in data:
-            self.mercury_status.labels(**common_labels).set(data["galileosky_mercury_state"])
-
-        # Frequency
-        if "galileosky_mercury_f" in data:
-            self.mercury_frequency.labels(**common_labels).set(data["galileosky_mercury_f"])
-
-        # Voltage
-        for i, key in enumerate(["galileosky_mercury_u1", "galileosky_mercury_u2", "galileosky_mercury_u3"], 1):
-            if key in data:
-                self.mercury_voltage.labels(**common_labels, phase=str(i)).set(data[key])
-
-        # Current
-        for i, key in enumerate(["galileosky_mercury_i1", "galileosky_mercury_i2", "galileosky_mercury_i3"], 1):
-            if key in data:
-                self.mercury_current.labels(**common_labels, phase=str(i)).set(data[key])
-
-        # Angles
-        angle_map = {
-            "galileosky_mercury_a12": "1-2",
-            "galileosky_mercury_a23": "2-3",
-            "galileosky_mercury_a13": "1-3"
-        }
-        for key, pair in angle_map.items():
-            if key in data:
-                self.mercury_angle.labels(**common_labels, phase_pair=pair).set(data[key])
-
-        # Active Power
-        power_map = {
-            "galileosky_mercury_p1": "1",
-            "galileosky_mercury_p2": "2",
-            "galileosky_mercury_p3": "3",
-            "galileosky_mercury_ps": "sum"
-        }
-        for key, phase in power_map.items():
+        for key, _, gauge, extra_labels in self.series:
             if key in data:
-                self.mercury_active_power.labels(**common_labels, phase=phase).set(data[key])
+                gauge.labels(**common_labels, **extra_labels).set(data[key])
 
-        # Active Energy Forward
-        if "galileosky_mercury_pa_plus" in data:
-            self.mercury_active_energy_fwd.labels(**common_labels).set(data["galileosky_mercury_pa_plus"])
-
-        # Power Factor
-        pf_map = {
-            "galileosky_mercury_ks1": "1",
-            "galileosky_mercury_ks2": "2",
-            "galileosky_mercury_ks3": "3",
-            "galileosky_mercury_kss": "sum"
-        }
-        for key, phase in pf_map.items():
-            if key in data:
-                self.mercury_power_factor.labels(**common_labels, phase=phase).set(data[key])
+    def samples(self, imei: str, mercury_id: str, data: dict):
+        """
+        Same series as update(), as (metric name, labels, value) for push export.
+        """
+        common_labels = {'imei': imei, 'mercury_id': mercury_id}
 
-        # Distortion
-        for i, key in enumerate(["galileosky_mercury_kg1", "galileosky_mercury_kg2", "galileosky_mercury_kg3"], 1):
-            if key in data:
-                self.mercury_distortion.labels(**common_labels, phase=str(i)).set(data[key])
+        result = []
+        for key, name, _, extra_labels in self.series:
+            value = data.get(key)
+            if isinstance(value, (int, float)):
+                result.append((name, {**common_labels, **extra_labels}, float(value)))
+        return result
 
 metrics = MercuryMetrics()
@@ -0,0 +1,222 @@
+import asyncio
+import gzip
+import http.client
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class RemoteWriteError(Exception):
+    """Ошибка отправки, после которой имеет смысл повторить попытку."""
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name: str, labels: Dict[str, str], value: float, timestamp_ms: int) -> str:
+    """Строка в текстовом формате Prometheus с меткой времени в миллисекундах."""
+    label_str = ",".join(f'{key}="{_escape_label(str(val))}"' for key, val in labels.items())
+    return f"{name}{{{label_str}}} {value!r} {timestamp_ms}\n"
+
+
+class RemoteWriteExporter:
+    """
+    Пакетная отправка замеров в VictoriaMetrics (/api/v1/import/prometheus).
+
+    В отличие от pull-метрик каждый замер уходит со своим временем
+    из записи терминала, поэтому промежуточные значения между опросами
+    Prometheus не теряются. Замеры копятся в памяти и отправляются пачкой
+    (gzip) по размеру или по таймеру через одно постоянное соединение.
+    Если сервер недоступен после повторов, пачка сохраняется на диск
+    и досылается после восстановления связи.
+    """
+
+    # Время записи терминала для меток времени замеров
+    REQUIRED_FIELDS: FrozenSet[str] = frozenset({"timestamp", "milliseconds"})
+
+    def __init__(
+        self,
+        url: str,
+        batch_size: int = 5000,
+        flush_interval: float = 5.0,
+        spool_dir: str = "spool",
+        spool_max_bytes: int = 256 * 1024 * 1024,
+        retries: int = 3,
+        timeout: float = 10.0,
+    ):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported remote write URL: {url!r}")
+        self.url = url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self.spool_max_bytes = spool_max_bytes
+        self.retries = max(1, retries)
+        self.timeout = timeout
+
+        self._lines: List[str] = []
+        # Один поток: HTTP-соединение переиспользуется и не делится между потоками
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-write")
+        self._conn: Optional[http.client.HTTPConnection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+
+    def push(self, samples: Iterable[Sample], timestamp_ms: int):
+        """Добавляет замеры одной записи в очередь на отправку."""
+        for name, labels, value in samples:
+            self._lines.append(format_sample(name, labels, value, timestamp_ms))
+
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        if len(self._lines) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Отправляет накопленные замеры, при неудаче - сохраняет их на диск."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            loop = asyncio.get_running_loop()
+            lines, self._lines = self._lines, []
+
+            if lines:
+                body = gzip.compress("".join(lines).encode("utf-8"))
+                # Отправка и сохранение на диск - одно задание потока: если ожидание
+                # отменят (close() при остановке), пачка всё равно не потеряется
+                sent = await loop.run_in_executor(self._executor, self._send_or_spool, body)
+                if not sent:
+                    return
+
+            await loop.run_in_executor(self._executor, self._replay_spool)
+
+    async def close(self):
+        """Останавливает фоновую отправку и досылает остаток."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Remote write flush failed: {e}", exc_info=True)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self._scheme == "https" else http.client.HTTPConnection
+            self._conn = cls(self._host, self._port, timeout=self.timeout)
+        return self._conn
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _send(self, body: bytes):
+        """
+        :raises RemoteWriteError: При сетевой ошибке или ответе 5xx.
+        """
+        conn = self._connection()
+        try:
+            conn.request("POST", self._path, body=body, headers={
+                "Content-Type": "text/plain",
+                "Content-Encoding": "gzip",
+            })
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            self._close_connection()
+            raise RemoteWriteError(str(e)) from e
+
+        if response.status >= 500:
+            raise RemoteWriteError(f"HTTP {response.status}: {payload[:200]!r}")
+        if response.status >= 400:
+            # Повтор не поможет: данные отбрасываются
+            logger.error(f"Remote write rejected batch: HTTP {response.status}: {payload[:200]!r}")
+
+    def _send_with_retry(self, body: bytes) -> bool:
+        for attempt in range(self.retries):
+            try:
+                self._send(body)
+                return True
+            except RemoteWriteError as e:
+                logger.warning(f"Remote write attempt {attempt + 1}/{self.retries} failed: {e}")
+                if attempt + 1 < self.retries:
+                    time.sleep(min(0.5 * 2 ** attempt, 5.0))
+        return False
+
+    def _send_or_spool(self, body: bytes) -> bool:
+        """
+        :return: True, если пачка отправлена, False - если сохранена на диск.
+        """
+        if self._send_with_retry(body):
+            return True
+        self._spool(body)
+        return False
+
+    def _spool_files(self) -> List[str]:
+        if not os.path.isdir(self.spool_dir):
+            return []
+        return sorted(
+            os.path.join(self.spool_dir, name)
+            for name in os.listdir(self.spool_dir)
+            if name.endswith(".prom.gz")
+        )
+
+    def _spool(self, body: bytes):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}.prom.gz")
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+
+        # Ограничение размера: самые старые пачки удаляются первыми
+        files = self._spool_files()
+        total = sum(os.path.getsize(name) for name in files)
+        while files and total > self.spool_max_bytes:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)
+            logger.warning(f"Remote write spool is full, dropped {oldest}")
+        logger.warning(f"Remote write unavailable, batch spooled to {path}")
+
+    def _replay_spool(self):
+        for path in self._spool_files():
+            with open(path, "rb") as f:
+                body = f.read()
+            try:
+                self._send(body)
+            except RemoteWriteError as e:
+                logger.debug(f"Remote write still unavailable: {e}")
+                return
+            os.remove(path)
+            logger.info(f"Replayed spooled batch {path}")
@@ -0,0 +1,333 @@
+import asyncio
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Set
+
+import aiofiles
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен, без него сжимаем gzip
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_SUFFIX = ".idx.json"
+
+
+def _compressed_suffix(compression: str) -> str:
+    if compression == "zstd" and zstandard is not None:
+        return ".zst"
+    return ".gz"
+
+
+def _compress_block(block: bytes, suffix: str) -> bytes:
+    if suffix == ".zst":
+        return zstandard.ZstdCompressor(level=3).compress(block)
+    return gzip.compress(block, compresslevel=6)
+
+
+def compress_segment(segment_path: str, compression: str, index_every: int) -> str:
+    """
+    Сжимает закрытый сегмент и строит для него индекс.
+
+    Каждые index_every записей начинается новый независимый блок
+    (отдельный gzip-member или zstd-фрейм), поэтому читатель может
+    перейти по смещению из индекса и распаковывать с середины файла.
+    Выполняется в пуле потоков, не в цикле событий.
+
+    :return: Путь к сжатому сегменту.
+    """
+    suffix = _compressed_suffix(compression)
+    target_path = segment_path + suffix
+    tmp_path = target_path + ".tmp"
+
+    blocks: List[Dict[str, Any]] = []
+    devices: Set[str] = set()
+    first_ts: Optional[str] = None
+    last_ts: Optional[str] = None
+    records = 0
+    offset = 0
+    compressed_offset = 0
+    block = bytearray()
+
+    with open(segment_path, "rb") as src, open(tmp_path, "wb") as dst:
+        for line in src:
+            if records % index_every == 0:
+                if block:
+                    compressed_offset += dst.write(_compress_block(bytes(block), suffix))
+                    block.clear()
+                blocks.append({
+                    "record": records,
+                    "offset": offset,
+                    "compressed_offset": compressed_offset,
+                    "first_ts": None,
+                })
+
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = {}
+            ts = record.get("_received_at")
+            if ts is not None:
+                first_ts = first_ts if first_ts is not None else ts
+                last_ts = ts
+                if blocks[-1]["first_ts"] is None:
+                    blocks[-1]["first_ts"] = ts
+            # Отбор сегментов по устройству работает, только если в записях
+            # IMEI терминала, а не общее значение (см. format_mercury_data)
+            if record.get("imei") is not None:
+                devices.add(str(record["imei"]))
+
+            block += line
+            offset += len(line)
+            records += 1
+
+        if block:
+            dst.write(_compress_block(bytes(block), suffix))
+
+    index = {
+        "segment": os.path.basename(target_path),
+        "compression": suffix.lstrip("."),
+        "records": records,
+        "bytes": offset,
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "devices": sorted(devices),
+        "blocks": blocks,
+    }
+    with open(target_path + INDEX_SUFFIX + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+    # Сначала данные, потом индекс: индекс без сегмента не должен появиться
+    os.replace(tmp_path, target_path)
+    os.replace(target_path + INDEX_SUFFIX + ".tmp", target_path + INDEX_SUFFIX)
+    os.remove(segment_path)
+    return target_path
+
+
+class RotatingJsonlWriter:
+    """
+    Запись JSON Lines с ротацией по размеру и времени.
+
+    Активный файл всегда лежит по исходному пути (его читает Promtail).
+    При ротации он переименовывается в сегмент с меткой времени,
+    а сжатие и построение индекса выполняются в фоне.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        max_bytes: int,
+        max_age: int,
+        compression: str = "zstd",
+        index_every: int = 1000,
+    ):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.compression = compression
+        self.index_every = max(1, index_every)
+
+        self._lock = asyncio.Lock()
+        self._file = None
+        self._size = 0
+        self._opened_at = 0.0
+        self._pending: Set[asyncio.Future] = set()
+
+    async def write(self, record: Dict[str, Any]):
+        """Сериализует и дописывает одну запись."""
+        await self.write_line(json.dumps(record, ensure_ascii=False))
+
+    async def write_line(self, line: str):
+        """Дописывает строку, при необходимости ротируя файл."""
+        data = line + "\n"
+        async with self._lock:
+            if self._file is None:
+                await self._open()
+            elif self._should_rotate():
+                await self._rotate()
+
+            await self._file.write(data)
+            await self._file.flush()
+            self._size += len(data.encode("utf-8"))
+
+    async def close(self):
+        """Закрывает активный файл и дожидается фонового сжатия."""
+        async with self._lock:
+            if self._file is not None:
+                await self._file.close()
+                self._file = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def _should_rotate(self) -> bool:
+        if self._size == 0:
+            return False
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        if self.max_age and time.monotonic() - self._opened_at >= self.max_age:
+            return True
+        return False
+
+    async def _open(self):
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = await aiofiles.open(self.file_path, mode="a", encoding="utf-8")
+        self._size = await self._file.tell()
+        self._opened_at = time.monotonic()
+
+        # Сегменты, которые не успели сжать до остановки сервиса
+        for segment_path in self._uncompressed_segments():
+            self._schedule_compression(segment_path)
+
+    async def _rotate(self):
+        await self._file.close()
+        self._file = None
+
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        stem, ext = os.path.splitext(self.file_path)
+        segment_path = f"{stem}.{stamp}{ext}"
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, os.rename, self.file_path, segment_path)
+        logger.info(f"Rotated {self.file_path} -> {segment_path}")
+
+        self._file = await aiofiles.open(self.file_path, mode="a", encoding="utf-8")
+        self._size = 0
+        self._opened_at = time.monotonic()
+        self._schedule_compression(segment_path)
+
+    def _schedule_compression(self, segment_path: str):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            None, compress_segment, segment_path, self.compression, self.index_every
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._on_compressed)
+
+    def _on_compressed(self, future: asyncio.Future):
+        self._pending.discard(future)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Failed to compress segment: {error}")
+        else:
+            logger.debug(f"Segment compressed: {future.result()}")
+
+    def _uncompressed_segments(self) -> List[str]:
+        directory = os.path.dirname(self.file_path) or "."
+        stem, ext = os.path.splitext(os.path.basename(self.file_path))
+        prefix = stem + "."
+        return sorted(
+            os.path.join(directory, name)
+            for name in os.listdir(directory)
+            if name.startswith(prefix) and name.endswith(ext)
+            and _is_segment_stamp(name[len(prefix):-len(ext)])
+        )
+
+
+def _is_segment_stamp(value: str) -> bool:
+    date, sep, clock = value.partition("T")
+    return bool(sep) and date.isdigit() and clock.isdigit()
+
+
+def load_indexes(file_path: str) -> List[Dict[str, Any]]:
+    """Загружает индексы всех сжатых сегментов в порядке их создания."""
+    directory = os.path.dirname(file_path) or "."
+    stem, _ = os.path.splitext(os.path.basename(file_path))
+    indexes = []
+    for name in sorted(os.listdir(directory)):
+        if name.startswith(stem + ".") and name.endswith(INDEX_SUFFIX):
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                index = json.load(f)
+            index["path"] = os.path.join(directory, index["segment"])
+            indexes.append(index)
+    return indexes
+
+
+def _segment_matches(index: Dict[str, Any], since: Optional[str], until: Optional[str],
+                     imei: Optional[str]) -> bool:
+    if index["first_ts"] is None:
+        return False
+    if since is not None and index["last_ts"] < since:
+        return False
+    if until is not None and index["first_ts"] > until:
+        return False
+    if imei is not None and imei not in index["devices"]:
+        return False
+    return True
+
+
+def _open_segment(index: Dict[str, Any], compressed_offset: int):
+    raw = open(index["path"], "rb")
+    raw.seek(compressed_offset)
+    if index["compression"] == "zst":
+        if zstandard is None:
+            raw.close()
+            raise RuntimeError(f"zstandard is required to read {index['path']}")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.BufferedReader(reader)
+    return gzip.GzipFile(fileobj=raw, mode="rb")
+
+
+def iter_records(
+    file_path: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    imei: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Читает записи из сжатых сегментов и активного файла.
+
+    Сегменты, которые по индексу не пересекаются с интервалом
+    [since, until] или не содержат устройство imei, пропускаются целиком;
+    внутри сегмента чтение начинается с ближайшего блока перед since.
+    Метки времени сравниваются как строки ISO 8601.
+    """
+    def matches(record: Dict[str, Any]) -> bool:
+        ts = record.get("_received_at")
+        if since is not None and (ts is None or ts < since):
+            return False
+        if until is not None and (ts is None or ts > until):
+            return False
+        if imei is not None and str(record.get("imei")) != imei:
+            return False
+        return True
+
+    for index in load_indexes(file_path):
+        if not _segment_matches(index, since, until, imei):
+            continue
+
+        start = 0
+        if since is not None:
+            for block in index["blocks"]:
+                if block["first_ts"] is not None and block["first_ts"] <= since:
+                    start = block["compressed_offset"]
+                else:
+                    break
+
+        with _open_segment(index, start) as stream:
+            for line in stream:
+                record = json.loads(line)
+                if until is not None and record.get("_received_at", "") > until:
+                    break
+                if matches(record):
+                    yield record
+
+    if os.path.exists(file_path):
+        with open(file_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # строка могла быть дописана не полностью
+                if matches(record):
+                    yield record
@@ -1,18 +1,24 @@
 import json
+import logging
 from math import sqrt
 
-import aiofiles
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, FrozenSet, Optional
+from src.config import config
 from src.domain.interfaces import IStorage
 from src.domain.mercury import Mercury230Data
 from src.infrastructure.metrics import metrics
+from src.infrastructure.remote_write import RemoteWriteExporter
+from src.infrastructure.rotation import RotatingJsonlWriter
 
-def format_mercury_data(mercury_data: Mercury230Data, received_at: str, enters, temps) -> Dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+def format_mercury_data(mercury_data: Mercury230Data, received_at: str, enters, temps, imei: str) -> Dict[str, Any]:
     """
     Форматирует объект данных в структурированный словарь,
     совместимый с метриками дашборда (плоская структура для удобства парсинга в Loki).
     Значения сохраняются в естественных единицах (В, А, Вт, Гц), без дополнительных множителей.
+    imei - IMEI терминала, приславшего запись.
     """
     return {
         "enter0": int(enters["enter0"]),
@@ -32,7 +38,7 @@ def format_mercury_data(mercury_data: Mercury230Data, received_at: str, enters,
 
         "_received_at": received_at,
         "mercury_id": str(mercury_data.address),
-        "imei": "869531073980322",
+        "imei": imei,
         
         # Статусы
         "galileosky_mercury_state": mercury_data.status,
@@ -83,10 +89,54 @@ def format_mercury_data(mercury_data: Mercury230Data, received_at: str, enters,
 class JsonFileStorage(IStorage):
     """
     Реализация хранилища, сохраняющая данные в JSON файл (формат JSON Lines).
+    Файлы данных и ошибок ротируются, закрытые сегменты сжимаются в фоне.
+    Если задан exporter, замеры записи отправляются в него с временем терминала.
     """
 
-    def __init__(self, file_path: str = "parsed_data.jsonl"):
+    # Входы, статусы, термометры и массив пользователя с данными Меркурия
+    REQUIRED_FIELDS: FrozenSet[str] = frozenset(
+        [f"enter{i}" for i in range(4)]
+        + [f"galileosky_temp{i}" for i in range(8)]
+        + ["outputs_status", "inputs_status", "user_array"]
+    )
+
+    def __init__(self, file_path: str = config.STORAGE_PATH, exporter: Optional[RemoteWriteExporter] = None):
         self.file_path = file_path
+        self.exporter = exporter
+        self.errors_path = file_path.replace('.jsonl', '_errors.jsonl')
+        self._writer = self._make_writer(self.file_path)
+        self._errors_writer = self._make_writer(self.errors_path)
+
+    @staticmethod
+    def _make_writer(file_path: str) -> RotatingJsonlWriter:
+        return RotatingJsonlWriter(
+            file_path,
+            max_bytes=config.ROTATE_MAX_BYTES,
+            max_age=config.ROTATE_INTERVAL,
+            compression=config.ROTATE_COMPRESSION,
+            index_every=config.ROTATE_INDEX_EVERY,
+        )
+
+    @property
+    def required_fields(self) -> Optional[FrozenSet[str]]:
+        if self.exporter is not None:
+            return self.REQUIRED_FIELDS | self.exporter.REQUIRED_FIELDS
+        return self.REQUIRED_FIELDS
+
+    async def close(self):
+        await self._writer.close()
+        await self._errors_writer.close()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+    @staticmethod
+    def _device_time_ms(tags: Dict[str, Any]) -> int:
+        """Время записи терминала (теги 0x20 и 0x21), без него - время приёма."""
+        timestamp = tags.get("0x20")
+        if not isinstance(timestamp, int) or timestamp <= 0:
+            return int(datetime.now().timestamp() * 1000)
+        milliseconds = tags.get("0x21")
+        return timestamp * 1000 + (milliseconds if isinstance(milliseconds, int) else 0)
 
     async def save(self, packet_data: Dict[str, Any]):
         tags = packet_data.get("tags", {})
@@ -131,9 +181,11 @@ class JsonFileStorage(IStorage):
                     raise ValueError(f"Expected Mercury230Data, got {type(mercury_obj)}")
 
                 received_at = datetime.now().isoformat()
-                
+                # IMEI сессии; тег 0x03 есть только в первом пакете подключения
+                imei = packet_data.get("imei") or tags.get("0x03") or "unknown"
+
                 # Форматирование данных
-                formatted_data = format_mercury_data(mercury_obj, received_at, enters_data, temps)
+                formatted_data = format_mercury_data(mercury_obj, received_at, enters_data, temps, imei)
 
                 try:
                     metrics_data = formatted_data.copy()
@@ -152,13 +204,17 @@ class JsonFileStorage(IStorage):
                         mercury_id=metrics_data["mercury_id"],
                         data=metrics_data
                     )
+                    if self.exporter is not None:
+                        self.exporter.push(
+                            metrics.samples(metrics_data["imei"], metrics_data["mercury_id"], metrics_data),
+                            self._device_time_ms(tags),
+                        )
                 except Exception as e:
-                    print(f"Error updating metrics: {e}")
+                    logger.error("Error updating metrics: %s", e)
 
                 # Сохранение в файл (JSON Lines)
                 json_line = json.dumps(formatted_data, ensure_ascii=False)
-                async with aiofiles.open(self.file_path, mode='a', encoding='utf-8') as f:
-                    await f.write(json_line + "\n")
+                await self._writer.write_line(json_line)
 
             except Exception as e:
                 error_data = {
@@ -167,6 +223,9 @@ class JsonFileStorage(IStorage):
                     "raw_data": str(tags.get("0xEA"))
                 }
                 json_line = json.dumps(error_data, ensure_ascii=False)
-                async with aiofiles.open(self.file_path.replace('.jsonl', '_errors.jsonl'),
-                                         mode='a', encoding='utf-8') as f:
-                    await f.write(json_line + "\n")
\ No newline at end of file
+                await self._errors_writer.write_line(json_line)
+
+    async def save_rejected(self, packet_data: Dict[str, Any]):
+        error_data = {"_received_at": datetime.now().isoformat(), **packet_data}
+        json_line = json.dumps(error_data, ensure_ascii=False)
+        await self._errors_writer.write_line(json_line)
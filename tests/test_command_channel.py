@@ -0,0 +1,161 @@
+import asyncio
+import struct
+
+import pytest
+
+from src.domain.commands import build_command_packet, crc16_modbus
+from src.infrastructure.command_channel import DONE, FAILED, QUEUED, SENT, TIMEOUT, CommandChannel, DeviceSession
+
+IMEI = "860000000000001"
+
+
+class FakeWriter:
+    """Запоминает записи в сокет; fail - сколько следующих drain завершатся ошибкой."""
+
+    def __init__(self, fail=0):
+        self.writes = []
+        self.fail = fail
+
+    def write(self, data):
+        self.writes.append(data)
+
+    async def drain(self):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionResetError("connection reset")
+
+
+def split_packets(data):
+    packets = []
+    while data:
+        length = struct.unpack("<H", data[1:3])[0]
+        packets.append(data[:length + 5])
+        data = data[length + 5:]
+    return packets
+
+
+def command_number(packet):
+    index = packet.index(b"\xe0")
+    return struct.unpack("<I", packet[index + 1:index + 5])[0]
+
+
+def test_crc16_modbus_check_value():
+    assert crc16_modbus(b"123456789") == 0x4B37
+
+
+def test_build_command_packet():
+    packet = build_command_packet(IMEI, 1, 5, "status")
+
+    assert packet == bytes.fromhex(
+        "012000" "03" + IMEI.encode("ascii").hex() + "040100" "E005000000" "E106" + b"status".hex() + "505E"
+    )
+    # CRC по пакету вместе с CRC равен нулю
+    assert crc16_modbus(packet) == 0
+
+
+def test_build_command_packet_rejects_bad_input():
+    with pytest.raises(ValueError):
+        build_command_packet("123", 0, 1, "status")
+    with pytest.raises(ValueError):
+        build_command_packet(IMEI, 0, 1, "x" * 256)
+
+
+def test_queued_commands_go_out_in_one_send():
+    async def scenario():
+        channel = CommandChannel(batch_size=8)
+        first = channel.enqueue(IMEI, "status")
+        second = channel.enqueue(IMEI, "imei")
+        assert first.status == QUEUED
+
+        writer = FakeWriter()
+        channel.register(DeviceSession(writer, ("127.0.0.1", 40000)), IMEI, device_id=7)
+        channel.enqueue(IMEI, "reset")
+        await asyncio.sleep(0.01)
+        return writer, [first, second], channel
+
+    writer, commands, channel = asyncio.run(scenario())
+
+    assert len(writer.writes) == 1
+    packets = split_packets(writer.writes[0])
+    assert [command_number(packet) for packet in packets] == [1, 2, 3]
+    assert all(crc16_modbus(packet) == 0 for packet in packets)
+    assert all(command.status == SENT for command in commands)
+    assert channel.queue_depth(IMEI) == 0
+
+
+def test_reply_is_matched_by_command_number():
+    async def scenario():
+        channel = CommandChannel()
+        channel.register(DeviceSession(FakeWriter(), ("127.0.0.1", 40000)), IMEI)
+        command = channel.enqueue(IMEI, "status")
+        await asyncio.sleep(0.01)
+
+        # Ответ с тем же номером от другого устройства не принимается
+        channel.resolve("860000000000002", command.id, "foreign")
+        assert not command.future.done()
+
+        channel.resolve(IMEI, command.id, "OK")
+        return await asyncio.wait_for(command.future, 1)
+
+    command = asyncio.run(scenario())
+
+    assert command.status == DONE
+    assert command.response == "OK"
+    assert command.completed_at is not None
+
+
+def test_command_times_out_without_reply():
+    async def scenario():
+        channel = CommandChannel()
+        channel.register(DeviceSession(FakeWriter(), ("127.0.0.1", 40000)), IMEI)
+        command = channel.enqueue(IMEI, "status", timeout=0.05)
+        return await asyncio.wait_for(command.future, 1)
+
+    command = asyncio.run(scenario())
+
+    assert command.status == TIMEOUT
+    assert command.error == "no response"
+
+
+def test_disconnect_fails_commands_in_flight():
+    async def scenario():
+        channel = CommandChannel()
+        session = DeviceSession(FakeWriter(), ("127.0.0.1", 40000))
+        channel.register(session, IMEI)
+        sent = channel.enqueue(IMEI, "status")
+        await asyncio.sleep(0.01)
+
+        channel.unregister(session)
+        # Команда без сессии остаётся в очереди до переподключения
+        queued = channel.enqueue(IMEI, "imei")
+        await asyncio.sleep(0.01)
+        return channel, sent, queued
+
+    channel, sent, queued = asyncio.run(scenario())
+
+    assert sent.status == FAILED
+    assert sent.error == "connection closed"
+    assert queued.status == QUEUED
+    assert channel.queue_depth(IMEI) == 1
+
+
+def test_failed_send_requeues_batch():
+    async def scenario():
+        channel = CommandChannel()
+        broken = DeviceSession(FakeWriter(fail=1), ("127.0.0.1", 40000))
+        channel.register(broken, IMEI)
+        commands = [channel.enqueue(IMEI, "status"), channel.enqueue(IMEI, "imei")]
+        await asyncio.sleep(0.01)
+        assert [command.status for command in commands] == [QUEUED, QUEUED]
+        assert channel.queue_depth(IMEI) == 2
+        channel.unregister(broken)
+
+        writer = FakeWriter()
+        channel.register(DeviceSession(writer, ("127.0.0.1", 40001)), IMEI)
+        await asyncio.sleep(0.01)
+        return writer, commands
+
+    writer, commands = asyncio.run(scenario())
+
+    assert [command_number(packet) for packet in split_packets(writer.writes[0])] == [command.id for command in commands]
+    assert [command.status for command in commands] == [SENT, SENT]
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from src.domain.device_state import DeviceStateStore, Geofence
+from src.infrastructure.command_channel import CommandChannel
+from src.infrastructure.control_api import ControlApi
+
+
+async def request(port, method, path, payload=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+def run_api(states, scenario):
+    async def main():
+        api = ControlApi(CommandChannel(), "127.0.0.1", 0, states)
+        await api.start()
+        try:
+            return await scenario(api.server.sockets[0].getsockname()[1])
+        finally:
+            await api.stop()
+
+    return asyncio.run(main())
+
+
+def test_store_rejects_fence_over_cell_limit():
+    states = DeviceStateStore(cell_deg=0.1, max_fence_cells=100)
+    states.add_geofence(Geofence("yard", bbox=[55.0, 37.0, 55.5, 37.5]))
+
+    with pytest.raises(ValueError, match="grid cells"):
+        states.add_geofence(Geofence("yard", bbox=[-90, -180, 90, 180]))
+    # Отклонённая замена не удаляет существующую геозону
+    assert "yard" in states.geofences
+
+
+def test_api_returns_400_for_oversized_fence():
+    states = DeviceStateStore(cell_deg=0.1, max_fence_cells=1000)
+
+    async def scenario(port):
+        rejected = await request(port, "POST", "/geofences", {"name": "world", "bbox": [-90, -180, 90, 180]})
+        created = await request(port, "POST", "/geofences", {"name": "depot", "lat": 55.75, "lon": 37.62, "radius_m": 500})
+        listed = await request(port, "GET", "/geofences")
+        return rejected, created, listed
+
+    rejected, created, listed = run_api(states, scenario)
+
+    assert rejected[0] == 400 and "grid cells" in rejected[1]["error"]
+    assert created[0] == 201
+    assert listed == (200, [{"name": "depot", "lat": 55.75, "lon": 37.62, "radius_m": 500}])
+
+
+def test_api_device_queries():
+    states = DeviceStateStore(cell_deg=0.1)
+    states.update("860000000000001", {"0x20": 1700000000, "0x30": {"latitude": 55.75, "longitude": 37.62, "satellites": 9, "correctness": 0}})
+
+    async def scenario(port):
+        return (
+            await request(port, "GET", "/devices/860000000000001"),
+            await request(port, "GET", "/devices?lat=55.75&lon=37.62&radius=1000"),
+            await request(port, "GET", "/devices/unknown"),
+        )
+
+    device, nearby, missing = run_api(states, scenario)
+
+    assert device[0] == 200 and device[1]["imei"] == "860000000000001"
+    assert [item["imei"] for item in nearby[1]] == ["860000000000001"]
+    assert missing[0] == 404
@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from src.domain.decoders import TagDecoder
+from src.domain.tags import compile_tag_entries
+
+
+def sub_tag(num, payload):
+    return list(struct.pack("<H", num) + payload)
+
+
+def test_extended_decodes_known_sub_tags():
+    data = sub_tag(0x0085, b"\x1f") + sub_tag(0x0081, struct.pack("<H", 4660)) + sub_tag(0x0001, struct.pack("<I", 12345))
+
+    assert TagDecoder.decode(0xFE, data) == {"0x0085": 31, "0x0081": 4660, "0x0001": 123.45}
+
+
+def test_extended_decodes_fields_and_scale():
+    data = (sub_tag(0x0086, struct.pack("<Hh", 7, -1280))
+            + sub_tag(0x00AB, struct.pack("<III", 100, 90, 80)))
+
+    assert TagDecoder.decode(0xFE, data) == {
+        "0x0086": {"id": 7, "temperature": -5.0},
+        "0x00AB": {"total": 100, "sent_main": 90, "sent_extra": 80},
+    }
+
+
+def test_extended_skips_unwanted_sub_tags_without_decoding(monkeypatch):
+    decoded = []
+    original = TagDecoder._decode_value
+    monkeypatch.setattr(TagDecoder, "_decode_value",
+                        staticmethod(lambda tag, data: decoded.append(tag.num) or original(tag, data)))
+    data = sub_tag(0x0092, b"250011234567890") + sub_tag(0x0085, b"\x1f")
+
+    assert TagDecoder.decode(0xFE, data, frozenset({0x0085})) == {"0x0085": 31}
+    assert decoded == [0x0085]
+
+
+def test_unknown_sub_tag_ends_walk_with_raw():
+    data = sub_tag(0x0085, b"\x1f") + sub_tag(0x7777, b"\x01\x02") + sub_tag(0x0081, b"\x01\x00")
+
+    assert TagDecoder.decode(0xFE, data) == {"0x0085": 31, "raw": "7777010281000100"}
+
+
+def test_truncated_last_sub_tag_is_kept_raw():
+    data = sub_tag(0x0085, b"\x1f") + sub_tag(0x0001, b"\x01\x02")
+
+    assert TagDecoder.decode(0xFE, data) == {"0x0085": 31, "raw": "01000102"}
+
+
+def test_trailing_byte_is_kept_raw():
+    assert TagDecoder.decode(0xFE, sub_tag(0x0085, b"\x1f") + [0xAA]) == {"0x0085": 31, "raw": "AA"}
+
+
+@pytest.mark.parametrize("entry", [
+    {"num": "0x50", "length": 4, "format": "<Hh", "fields": ["a", "b"], "scale": 0.5},
+    {"num": "0x50", "length": 4, "format": "<Hh", "fields": ["a", "b"], "scale": [1]},
+    {"num": "0x50", "length": 2, "format": "<H", "scale": [0.5]},
+])
+def test_scale_must_match_fields(entry):
+    with pytest.raises(ValueError, match="Scale"):
+        compile_tag_entries([entry])
@@ -0,0 +1,60 @@
+import struct
+
+from src.domain.dedup import RecordDeduplicator
+from src.domain.parser import TagParser
+
+
+def record(number, timestamp):
+    return b"\x10" + struct.pack("<H", number) + b"\x20" + struct.pack("<I", timestamp) + b"\x41\x10\x2e"
+
+
+def parse(body):
+    return TagParser().parse(list(body))
+
+
+HEADER = b"\x03868204005647838\x04\x32\x00"
+
+
+def test_split_records_keeps_header_without_key():
+    packet = parse(HEADER + record(1, 1700000000) + record(2, 1700000010))
+
+    records = RecordDeduplicator.split_records(packet)
+
+    assert [key for key, _ in records] == [None, (1, 1700000000), (2, 1700000010)]
+    assert [tag.tag.num for tag in records[0][1]] == [0x03, 0x04]
+    assert [tag.tag.num for tag in records[1][1]] == [0x10, 0x20, 0x41]
+    assert RecordDeduplicator.record_keys(packet) == [(1, 1700000000), (2, 1700000010)]
+
+
+def test_check_does_not_remember_until_commit():
+    dedup = RecordDeduplicator(window=16)
+    keys = RecordDeduplicator.record_keys(parse(record(1, 1700000000)))
+
+    assert dedup.check("imei", keys) == set()
+    # Сохранение не удалось - повтор не считается дубликатом
+    assert dedup.check("imei", keys) == set()
+
+    dedup.commit("imei", keys)
+    assert dedup.check("imei", keys) == set(keys)
+    assert dedup.check("other", keys) == set()
+
+
+def test_partially_seen_packet_keeps_new_records():
+    dedup = RecordDeduplicator(window=16)
+    dedup.commit("imei", [(1, 1700000000)])
+
+    packet = parse(HEADER + record(1, 1700000000) + record(2, 1700000010) + record(2, 1700000010))
+    seen = dedup.check("imei", RecordDeduplicator.record_keys(packet))
+    filtered = RecordDeduplicator.drop_records(packet, seen)
+
+    assert seen == {(1, 1700000000)}
+    # Заголовок и одна копия новой записи
+    assert RecordDeduplicator.record_keys(filtered) == [(2, 1700000010)]
+    assert [tag.tag.num for tag in filtered.tags][:2] == [0x03, 0x04]
+
+
+def test_window_evicts_oldest_keys():
+    dedup = RecordDeduplicator(window=2)
+    dedup.commit("imei", [(1, 1), (2, 2), (3, 3)])
+
+    assert dedup.check("imei", [(1, 1), (2, 2), (3, 3)]) == {(2, 2), (3, 3)}
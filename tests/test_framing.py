@@ -0,0 +1,32 @@
+import struct
+
+from src.domain.framing import FrameSplitter
+
+
+def frame(body: bytes) -> bytes:
+    return b"\x01" + struct.pack("<H", len(body)) + body + b"\x00\x00"
+
+
+def test_buffer_holds_at_most_one_incomplete_frame():
+    splitter = FrameSplitter(max_frame_length=64)
+    stream = frame(b"\xaa" * 64) * 3
+    frames = []
+    largest = 0
+
+    for byte in stream:
+        frames += splitter.feed(bytes([byte]))
+        largest = max(largest, len(splitter.buffer))
+
+    assert len(frames) == 3
+    assert largest == 64 + 5 - 1
+
+
+def test_oversized_header_is_skipped_as_garbage():
+    splitter = FrameSplitter(max_frame_length=64)
+
+    frames = splitter.feed(b"\x01" + struct.pack("<H", 65) + frame(b"\x10\x01\x00"))
+
+    assert frames == [frame(b"\x10\x01\x00")]
+    assert splitter.oversized == 1
+    assert splitter.skipped == 3
+    assert len(splitter.buffer) == 0
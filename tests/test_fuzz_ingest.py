@@ -0,0 +1,210 @@
+"""
+Фаззинг и замер худшего случая для разбора входного потока.
+
+Прогоняет случайные, обрезанные и специально построенные потоки через
+FrameSplitter, TagParser и TagDecoder (включая Mercury230Decoder) с теми же
+ограничениями, что и сервис, и проверяет, что:
+- разбор не падает с исключением;
+- буфер подключения не превышает MAX_FRAME_LENGTH + 5 байт;
+- время разбора пакета укладывается в бюджет (с запасом на одну проверку);
+- стоимость линейна: скорость в худшем сценарии сравнима с обычным потоком.
+
+Объём и зерно: GALILEOSKY_FUZZ_SIZE (байт на сценарий), GALILEOSKY_FUZZ_SEED.
+"""
+import os
+import random
+import struct
+import time
+from typing import Callable, Dict
+
+import pytest
+
+from src.config import config
+from src.domain.commands import crc16_modbus
+from src.domain.decoders import TagDecoder
+from src.domain.framing import FrameSplitter
+from src.domain.parser import TagParser
+from src.domain.tags import Tags
+
+CHUNK_SIZE = 1024
+STREAM_SIZE = int(os.getenv("GALILEOSKY_FUZZ_SIZE", 200_000))
+SEED = int(os.getenv("GALILEOSKY_FUZZ_SEED", 1))
+# Запас на интервал между проверками бюджета и на декодирование тегов
+PARSE_LIMIT = config.PARSE_TIME_BUDGET * 2 + 0.05
+
+
+def frame(body: bytes, archive: bool = False) -> bytes:
+    packet = bytes([0x01]) + struct.pack("<H", len(body) | (0x8000 if archive else 0)) + body
+    return packet + struct.pack("<H", crc16_modbus(packet))
+
+
+def normal_body(rng: random.Random, record: int) -> bytes:
+    """Типичная запись: IMEI, номер, время, координаты, входы, данные Меркурия."""
+    mercury = bytes([0x02, rng.randrange(256)]) + bytes(rng.randrange(256) for _ in range(91))
+    return (
+        b"\x03868204005647838\x04\x32\x00"
+        + b"\x10" + struct.pack("<H", record & 0xFFFF)
+        + b"\x20" + struct.pack("<I", 1700000000 + record) + b"\x21\x00\x00"
+        + b"\x30" + bytes.fromhex("07C00E3203B8D72D05") + b"\x33" + bytes.fromhex("5C004808")
+        + b"\x41\x10\x2e\x42\xa0\x0f"
+        + b"".join(bytes([0x50 + i]) + struct.pack("<H", rng.randrange(65536)) for i in range(4))
+        + b"".join(bytes([0x70 + i, i, rng.randrange(256)]) for i in range(8))
+        + b"\xea" + bytes([len(mercury)]) + mercury
+    )
+
+
+# Сценарии: функция (rng, size) -> поток байт
+def scenario_normal(rng: random.Random, size: int) -> bytes:
+    out = bytearray()
+    while len(out) < size:
+        out += frame(normal_body(rng, len(out)))
+    return bytes(out)
+
+
+def scenario_random(rng: random.Random, size: int) -> bytes:
+    return rng.randbytes(size)
+
+
+def scenario_headers_only(rng: random.Random, size: int) -> bytes:
+    # Сплошные 0x01: каждый байт похож на заголовок с длиной 0x0101
+    return b"\x01" * size
+
+
+def scenario_oversized(rng: random.Random, size: int) -> bytes:
+    # Заголовки с длиной 0x7FFF, которые раньше заставляли копить 32 КБ
+    return b"\x01\xff\x7f" * (size // 3)
+
+
+def scenario_garbage_between(rng: random.Random, size: int) -> bytes:
+    out = bytearray()
+    while len(out) < size:
+        out += rng.randbytes(rng.randrange(1, 200)).replace(b"\x01", b"\x00")
+        out += frame(normal_body(rng, len(out)))
+    return bytes(out)
+
+
+def scenario_truncated(rng: random.Random, size: int) -> bytes:
+    out = bytearray()
+    while len(out) < size:
+        data = frame(normal_body(rng, len(out)))
+        out += data[:rng.randrange(1, len(data) + 1)]
+    return bytes(out)
+
+
+def scenario_unknown_tags(rng: random.Random, size: int) -> bytes:
+    # Кадры максимальной длины из неизвестных байт: разбор упирается в лимит пропусков
+    unknown = bytes(b for b in range(256) if Tags.get_tag(b) is None) or b"\x00"
+    out = bytearray()
+    while len(out) < size:
+        out += frame(bytes(rng.choice(unknown) for _ in range(config.MAX_FRAME_LENGTH)))
+    return bytes(out)
+
+
+def scenario_bad_lengths(rng: random.Random, size: int) -> bytes:
+    # Теги переменной длины, заявляющие длину больше пакета
+    out = bytearray()
+    while len(out) < size:
+        out += frame(b"\xfe\xff\xff" * (config.MAX_FRAME_LENGTH // 3))
+    return bytes(out)
+
+
+def scenario_tiny_tags(rng: random.Random, size: int) -> bytes:
+    # Максимум корректных тегов на кадр: самый дорогой допустимый пакет
+    out = bytearray()
+    while len(out) < size:
+        out += frame(b"\x01\x05" * (config.MAX_FRAME_LENGTH // 2))
+    return bytes(out)
+
+
+def scenario_mutated(rng: random.Random, size: int) -> bytes:
+    out = bytearray()
+    while len(out) < size:
+        data = bytearray(frame(normal_body(rng, len(out))))
+        for _ in range(rng.randrange(1, 8)):
+            data[rng.randrange(len(data))] = rng.randrange(256)
+        out += data
+    return bytes(out)
+
+
+SCENARIOS: Dict[str, Callable[[random.Random, int], bytes]] = {
+    "normal": scenario_normal,
+    "random": scenario_random,
+    "headers_only": scenario_headers_only,
+    "oversized": scenario_oversized,
+    "garbage_between": scenario_garbage_between,
+    "truncated": scenario_truncated,
+    "unknown_tags": scenario_unknown_tags,
+    "bad_lengths": scenario_bad_lengths,
+    "tiny_tags": scenario_tiny_tags,
+    "mutated": scenario_mutated,
+}
+
+
+def run(stream: bytes) -> Dict[str, float]:
+    """Прогоняет поток как одно подключение, так же как listener_adapter."""
+    splitter = FrameSplitter(config.MAX_FRAME_LENGTH)
+    parser = TagParser(config.MAX_SKIPPED_BYTES, config.PARSE_TIME_BUDGET, config.MAX_SKIPPED_RATIO)
+    stats = {"frames": 0, "tags": 0, "truncated": 0, "max_buffer": 0, "max_parse": 0.0}
+
+    started = time.perf_counter()
+    for offset in range(0, len(stream), CHUNK_SIZE):
+        frames = splitter.feed(stream[offset:offset + CHUNK_SIZE])
+        stats["max_buffer"] = max(stats["max_buffer"], len(splitter.buffer))
+
+        for packet in frames:
+            parse_started = time.perf_counter()
+            parsed = parser.parse(list(packet[3:-2]))
+            for tag in parsed.tags:
+                TagDecoder.decode(tag.tag.num, tag.data)
+            stats["max_parse"] = max(stats["max_parse"], time.perf_counter() - parse_started)
+            stats["frames"] += 1
+            stats["tags"] += len(parsed.tags)
+            stats["truncated"] += parsed.truncated is not None
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed"] = elapsed
+    stats["mb_per_s"] = len(stream) / elapsed / 1e6 if elapsed else float("inf")
+    stats["skipped"] = splitter.skipped
+    return stats
+
+
+def fuzz_mercury(rng: random.Random, rounds: int) -> int:
+    """Случайные и почти корректные массивы 0xEA напрямую через декодер."""
+    for _ in range(rounds):
+        length = rng.choice([0, 1, 92, 93, 94, rng.randrange(256)])
+        data = list(rng.randbytes(length))
+        if data and rng.random() < 0.5:
+            data[0] = 0x02
+        TagDecoder.decode(0xEA, data)
+    return rounds
+
+
+@pytest.fixture(scope="module")
+def baseline() -> float:
+    """Скорость разбора обычного потока, МБ/с."""
+    return run(scenario_normal(random.Random(SEED), STREAM_SIZE))["mb_per_s"]
+
+
+@pytest.mark.parametrize("name", sorted(SCENARIOS))
+def test_scenario_stays_within_limits(name, baseline):
+    stream = SCENARIOS[name](random.Random(SEED), STREAM_SIZE)
+
+    stats = run(stream)
+
+    assert stats["max_buffer"] <= config.MAX_FRAME_LENGTH + 5
+    assert stats["max_parse"] <= PARSE_LIMIT, f"packet parse took {stats['max_parse'] * 1000:.1f} ms"
+    assert stats["mb_per_s"] >= baseline / 20, (
+        f"{stats['mb_per_s']:.2f} MB/s, normal traffic {baseline:.2f} MB/s"
+    )
+
+
+def test_normal_stream_is_parsed_completely():
+    stats = run(scenario_normal(random.Random(SEED), STREAM_SIZE))
+
+    assert stats["frames"] > 0
+    assert stats["truncated"] == 0
+    assert stats["skipped"] == 0
+
+
+def test_mercury_decoder_survives_fuzzing():
+    assert fuzz_mercury(random.Random(SEED), 20000) == 20000
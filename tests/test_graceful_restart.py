@@ -0,0 +1,150 @@
+"""
+Интеграционная проверка перезапуска: сервис запускается отдельным процессом,
+терминалы непрерывно шлют записи, сервис получает SIGHUP (exec с тем же
+слушающим сокетом), затем SIGTERM. Каждая подтверждённая запись должна
+оказаться в хранилище.
+"""
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+
+import pytest
+
+from src.domain.commands import crc16_modbus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLIENTS = 5
+RECORDS_PER_CLIENT = 300
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def frame(body: bytes) -> bytes:
+    packet = bytes([0x01]) + struct.pack("<H", len(body)) + body
+    return packet + struct.pack("<H", crc16_modbus(packet))
+
+
+def imei(client: int) -> str:
+    return f"86000000000{client:04d}"
+
+
+def record_body(client: int, number: int) -> bytes:
+    # Массив Меркурия: номер записи кодируется в счётчике активной энергии (Вт*ч)
+    mercury = bytearray(93)
+    mercury[0], mercury[1] = 0x02, 99
+    mercury[79], mercury[80] = number & 0xFF, number >> 8
+    return (
+        b"\x03" + imei(client).encode("ascii")
+        + b"\x10" + struct.pack("<H", number)
+        + b"\x20" + struct.pack("<I", 1700000000 + number)
+        + b"\xea" + bytes([len(mercury)]) + bytes(mercury)
+    )
+
+
+async def terminal(port: int, client: int, acked: set):
+    """Шлёт записи по одной и ждёт подтверждения, после обрыва переподключается."""
+    number = 0
+    while number < RECORDS_PER_CLIENT:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.05)
+            continue
+        try:
+            while number < RECORDS_PER_CLIENT:
+                writer.write(frame(record_body(client, number)))
+                await writer.drain()
+                await asyncio.wait_for(reader.readexactly(3), 5)
+                acked.add((imei(client), number))
+                number += 1
+                await asyncio.sleep(0.005)
+        except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+
+async def wait_listening(port: int, proc: subprocess.Popen, timeout: float = 10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        assert proc.poll() is None, "service exited on startup"
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.1)
+            continue
+        writer.close()
+        return
+    pytest.fail("service did not start listening")
+
+
+def stored_records(directory) -> set:
+    records = set()
+    for name in os.listdir(directory):
+        if name.startswith("parsed_data") and name.endswith(".jsonl") and "errors" not in name:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                for line in f:
+                    item = json.loads(line)
+                    records.add((item["imei"], round(item["galileosky_mercury_pa_plus"] * 1000)))
+    return records
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="SIGHUP is POSIX only")
+def test_restart_and_stop_keep_every_acked_record(tmp_path):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DEBUG="False",
+        GALILEOSKY_PORT=str(port),
+        GALILEOSKY_CONTROL_API_PORT="0",
+        GALILEOSKY_REMOTE_WRITE_URL="",
+        # Без сжатия сегментов: проверка читает только .jsonl
+        GALILEOSKY_ROTATE_MAX_BYTES="0",
+        GALILEOSKY_ROTATE_INTERVAL="0",
+    )
+    with open(tmp_path / "service.log", "w") as log:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "listener_service.py")],
+            cwd=tmp_path, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    acked: set = set()
+
+    async def scenario():
+        await wait_listening(port, proc)
+
+        async def signals():
+            await asyncio.sleep(0.5)
+            proc.send_signal(signal.SIGHUP)
+            await asyncio.sleep(1.0)
+            proc.send_signal(signal.SIGHUP)
+
+        await asyncio.wait_for(
+            asyncio.gather(signals(), *(terminal(port, client, acked) for client in range(CLIENTS))),
+            timeout=60,
+        )
+        await asyncio.sleep(0.5)
+        proc.send_signal(signal.SIGTERM)
+
+    try:
+        asyncio.run(scenario())
+        assert proc.wait(timeout=30) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    output = (tmp_path / "service.log").read_text()
+    assert output.count("Re-executing with inherited listening socket") == 2, output[-2000:]
+    assert len(acked) == CLIENTS * RECORDS_PER_CLIENT
+    missing = acked - stored_records(tmp_path)
+    assert not missing, f"{len(missing)} acked record(s) missing from storage"
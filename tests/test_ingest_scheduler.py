@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+from src.infrastructure.ingest_scheduler import IngestScheduler
+
+
+async def take_slots(scheduler, device, count, archive=True):
+    for _ in range(count):
+        async with scheduler.slot(device, archive):
+            pass
+
+
+def test_bucket_survives_reconnect():
+    imei = "860000000000001"
+
+    async def scenario():
+        scheduler = IngestScheduler(archive_rate=10, archive_burst=2)
+        # Как в адаптере: очередь по сессии, слоты - по IMEI сессии
+        session = object()
+        scheduler.set_depth(session, 2, imei)
+        await take_slots(scheduler, imei, 2)
+        scheduler.set_depth(session, 0, imei)
+        scheduler.forget(session)
+        assert session not in scheduler.depths
+
+        # Новое подключение того же IMEI не получает новый запас
+        reconnected = object()
+        scheduler.set_depth(reconnected, 1, imei)
+        started = time.monotonic()
+        await take_slots(scheduler, imei, 1)
+        waited = time.monotonic() - started
+
+        started = time.monotonic()
+        await take_slots(scheduler, "860000000000002", 2)
+        return waited, time.monotonic() - started
+
+    same_device, other_device = asyncio.run(scenario())
+    assert same_device >= 0.05
+    assert other_device < 0.05
+
+
+def test_live_frame_is_served_before_archive_backlog():
+    async def scenario():
+        scheduler = IngestScheduler(archive_rate=20, archive_burst=1)
+        await take_slots(scheduler, "860000000000001", 1)
+        granted = []
+
+        async def frame(name, archive):
+            async with scheduler.slot("860000000000001", archive):
+                granted.append(name)
+
+        # Токены исчерпаны: архивные кадры ждут, живой кадр, пришедший позже, - нет
+        tasks = [asyncio.create_task(frame(f"archive{n}", True)) for n in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(frame("live", False)))
+        await asyncio.wait_for(asyncio.gather(*tasks), 5)
+        return granted
+
+    assert asyncio.run(scenario()) == ["live", "archive0", "archive1", "archive2"]
+
+
+def test_live_frames_are_not_rate_limited():
+    async def scenario():
+        scheduler = IngestScheduler(archive_rate=1, archive_burst=1)
+        started = time.monotonic()
+        await take_slots(scheduler, "860000000000001", 20, archive=False)
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) < 0.5
+
+
+def test_idle_buckets_are_evicted():
+    scheduler = IngestScheduler(archive_rate=20, archive_burst=40, bucket_idle=600)
+    scheduler._bucket("a", 0.0)
+    scheduler._bucket("b", 300.0)
+
+    scheduler._bucket("c", 700.0)
+
+    assert list(scheduler._buckets) == ["b", "c"]
+
+
+def test_bucket_idle_is_not_shorter_than_refill():
+    scheduler = IngestScheduler(archive_rate=0.01, archive_burst=40, bucket_idle=600)
+    assert scheduler.bucket_idle == 4000
+
+    scheduler._bucket("a", 0.0)
+    scheduler._bucket("b", 3000.0)
+    assert list(scheduler._buckets) == ["a", "b"]
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import struct
+
+from src.domain.device_state import Geofence
+from src.infrastructure.command_channel import DeviceSession
+from src.infrastructure.listener_adapter import GalileoskyListenerAdapter
+from src.infrastructure.storage import JsonFileStorage
+
+IMEI = "860000000000001"
+
+
+class RecordingExporter:
+    REQUIRED_FIELDS = frozenset()
+
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, samples, timestamp_ms):
+        self.pushed.append((list(samples), timestamp_ms))
+
+    async def close(self):
+        pass
+
+
+class FakeWriter:
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+
+def record(number, lat, lon):
+    mercury = bytearray(93)
+    mercury[0], mercury[1] = 0x02, 99
+    mercury[79], mercury[80] = number & 0xFF, number >> 8
+    return (
+        b"\x10" + struct.pack("<H", number)
+        + b"\x20" + struct.pack("<I", 1700000000 + number)
+        + b"\x30" + struct.pack("<Bii", 9, round(lat * 1_000_000), round(lon * 1_000_000))
+        + b"\xea" + bytes([len(mercury)]) + bytes(mercury)
+    )
+
+
+def test_archive_packet_is_saved_per_record(tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "parsed.jsonl"
+    exporter = RecordingExporter()
+    # Вторая запись - внутри геозоны, третья - снова снаружи
+    body = (b"\x03" + IMEI.encode("ascii") + b"\x04" + struct.pack("<H", 7)
+            + record(1, 55.0, 37.0) + record(2, 55.75, 37.62) + record(3, 55.0, 37.0))
+
+    async def scenario():
+        adapter = GalileoskyListenerAdapter("127.0.0.1", 0)
+        await adapter.storage.close()
+        adapter.storage = JsonFileStorage(str(path), exporter=exporter)
+        adapter.states.add_geofence(Geofence("depot", lat=55.75, lon=37.62, radius_m=500))
+        session = DeviceSession(FakeWriter(), ("127.0.0.1", 40000))
+
+        await adapter.process_parsed_data(session.addr, adapter.parser.parse(list(body), adapter.projection), session)
+        # Повтор того же пакета отбрасывается целиком
+        await adapter.process_parsed_data(session.addr, adapter.parser.parse(list(body), adapter.projection), session)
+        await adapter.storage.close()
+        return adapter
+
+    with caplog.at_level(logging.INFO, logger="src.infrastructure.listener_adapter"):
+        adapter = asyncio.run(scenario())
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [round(item["galileosky_mercury_pa_plus"] * 1000) for item in records] == [1, 2, 3]
+    assert {item["imei"] for item in records} == {IMEI}
+    assert [timestamp_ms for _, timestamp_ms in exporter.pushed] == [1700000001000, 1700000002000, 1700000003000]
+
+    state = adapter.states.get(IMEI)
+    assert state.timestamp == 1700000003
+    assert state.geofences == set()
+    events = [message for message in caplog.messages if "geofence" in message]
+    assert events == [f"Device {IMEI} enter geofence depot", f"Device {IMEI} exit geofence depot"]
@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import queue
+import time
+
+from src.infrastructure.logging_setup import DroppingQueueHandler, LogSampler, ResyncReporter
+
+
+def make_record(message):
+    return logging.LogRecord("test", logging.INFO, __file__, 1, message, None, None)
+
+
+def test_full_queue_drops_records_without_blocking():
+    log_queue = queue.Queue(maxsize=2)
+    handler = DroppingQueueHandler(log_queue)
+
+    started = time.monotonic()
+    for n in range(5):
+        handler.handle(make_record(f"message {n}"))
+
+    assert time.monotonic() - started < 0.5
+    assert handler.dropped == 3
+    assert [log_queue.get_nowait().getMessage() for _ in range(2)] == ["message 0", "message 1"]
+
+
+def test_sampler_reports_suppressed_count_after_interval():
+    sampler = LogSampler(interval=0.05)
+
+    assert sampler.allow("860000000000001") == 0
+    assert [sampler.allow("860000000000001") for _ in range(4)] == [None] * 4
+    # Другой ключ ограничивается отдельно
+    assert sampler.allow("860000000000002") == 0
+
+    time.sleep(0.06)
+    assert sampler.allow("860000000000001") == 4
+    assert sampler.allow("860000000000001") is None
+
+
+def test_sampler_without_interval_allows_everything():
+    sampler = LogSampler(interval=0)
+    assert [sampler.allow("a") for _ in range(3)] == [0, 0, 0]
+
+
+def test_resync_summary_aggregates_per_source(caplog):
+    log = logging.getLogger("test.resync")
+
+    async def scenario():
+        reporter = ResyncReporter(interval=0.05, top=2, log=log)
+        reporter.record("10.0.0.1:5000", 3)
+        reporter.record("860000000000001", 10)
+        reporter.record("10.0.0.1:5000", 4)
+        reporter.record("10.0.0.2:5000", 1)
+        reporter.record("10.0.0.3:5000", 0)
+        await asyncio.sleep(0.1)
+        reporter.record("860000000000001", 2)
+        await asyncio.sleep(0.1)
+
+    with caplog.at_level(logging.WARNING, logger="test.resync"):
+        asyncio.run(scenario())
+
+    assert caplog.messages == [
+        "Skipped 18 garbage byte(s) from 3 source(s) in the last 0.05s, top: 860000000000001=10, 10.0.0.1:5000=7",
+        "Skipped 2 garbage byte(s) from 1 source(s) in the last 0.05s, top: 860000000000001=2",
+    ]
@@ -0,0 +1,50 @@
+import struct
+
+from src.domain.parser import TagParser
+from src.domain.projection import FieldProjection
+from src.domain.tags import Tags
+
+UNKNOWN = bytes(b for b in range(256) if Tags.get_tag(b) is None)
+
+
+def record(number):
+    return (
+        b"\x10" + struct.pack("<H", number)
+        + b"\x20" + struct.pack("<I", 1700000000 + number)
+        + b"\x30" + bytes.fromhex("07C00E3203B8D72D05")
+        + b"\x41\x10\x2e\x42\xa0\x0f"
+    )
+
+
+def tag_numbers(packet):
+    return [tag.tag.num for tag in packet.tags]
+
+
+def test_unknown_tag_in_long_packet_does_not_cut_following_records():
+    # Тег вне схемы с 100 байтами данных между записями
+    body = b"".join(record(n) for n in range(5)) + UNKNOWN[:1] * 100 + b"".join(record(n) for n in range(5, 10))
+
+    packet = TagParser(max_skipped_bytes=64).parse(list(body))
+
+    assert packet.truncated is None
+    assert packet.skipped_bytes == 100
+    assert tag_numbers(packet).count(0x10) == 10
+
+
+def test_skip_cap_applies_to_garbage():
+    body = record(1) + UNKNOWN[:1] * 500 + record(2)
+
+    packet = TagParser(max_skipped_bytes=64, max_skipped_ratio=0.5).parse(list(body))
+
+    assert packet.truncated == "skipped_bytes"
+    assert tag_numbers(packet).count(0x10) == 1
+    assert packet.skipped_bytes == int(len(body) * 0.5) + 1
+
+
+def test_projection_skips_tags_without_decoding():
+    body = record(1)
+
+    packet = TagParser().parse(list(body), FieldProjection(tags=frozenset({0x10, 0x41})))
+
+    assert tag_numbers(packet) == [0x10, 0x41]
+    assert packet.skipped_bytes == 0
@@ -0,0 +1,26 @@
+import pytest
+
+from src.domain.projection import INTERNAL_TAGS, EXTENDED_TAG_NUM, FieldProjection
+
+
+def test_explicit_fields_keep_internal_tags():
+    projection = FieldProjection.from_fields(["enter0"])
+
+    assert INTERNAL_TAGS <= projection.tags
+    assert projection.wants(0x50)
+    assert not projection.wants(0x51)
+
+
+def test_extended_subtags_add_0xfe():
+    projection = FieldProjection.from_fields(["0x30"])
+    assert EXTENDED_TAG_NUM not in projection.tags
+    assert projection.extended == frozenset()
+
+    projection = FieldProjection.from_fields(["0xFE"])
+    assert EXTENDED_TAG_NUM in projection.tags
+    assert projection.extended is None
+
+
+def test_unknown_field_is_rejected():
+    with pytest.raises(ValueError):
+        FieldProjection.from_fields(["no_such_field"])
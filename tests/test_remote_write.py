@@ -0,0 +1,154 @@
+import asyncio
+import gzip
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.infrastructure.metrics import metrics
+from src.infrastructure.remote_write import RemoteWriteExporter
+
+
+class StubImportServer:
+    """Заглушка /api/v1/import/prometheus: запоминает тела запросов, отвечает по списку статусов."""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                stub.requests.append((self.path, body.decode("utf-8")))
+                status = stub.statuses.pop(0) if stub.statuses else 204
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/api/v1/import/prometheus"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def record(imei, value):
+    return metrics.samples(imei, "99", {"galileosky_mercury_f": value, "galileosky_mercury_u1": 230.0})
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_batches_by_size_with_device_timestamps(tmp_path):
+    async def scenario(stub):
+        exporter = RemoteWriteExporter(stub.url, batch_size=4, flush_interval=60,
+                                       spool_dir=str(tmp_path / "spool"))
+        exporter.push(record("111", 50.0), 1700000000000)
+        await asyncio.sleep(0.05)
+        # Меньше batch_size - отправки нет до таймера
+        assert stub.requests == []
+
+        exporter.push(record("222", 49.9), 1700000001500)
+        await wait_for(lambda: stub.requests)
+        await exporter.close()
+
+    with StubImportServer() as stub:
+        asyncio.run(scenario(stub))
+
+    assert len(stub.requests) == 1
+    path, body = stub.requests[0]
+    assert path == "/api/v1/import/prometheus"
+    lines = body.splitlines()
+    assert len(lines) == 4
+    assert 'galileosky_mercury_frequency{imei="111",mercury_id="99"} 50.0 1700000000000' in lines
+    assert 'galileosky_mercury_frequency{imei="222",mercury_id="99"} 49.9 1700000001500' in lines
+    assert 'galileosky_mercury_voltage{imei="222",mercury_id="99",phase="1"} 230.0 1700000001500' in lines
+
+
+def test_retries_on_5xx(tmp_path):
+    async def scenario(stub):
+        exporter = RemoteWriteExporter(stub.url, batch_size=1000, flush_interval=60,
+                                       spool_dir=str(tmp_path / "spool"), retries=3)
+        exporter.push(record("111", 50.0), 1700000000000)
+        await exporter.flush()
+        await exporter.close()
+
+    with StubImportServer(statuses=[503]) as stub:
+        asyncio.run(scenario(stub))
+
+    assert len(stub.requests) == 2
+    assert stub.requests[0][1] == stub.requests[1][1]
+    assert not os.path.exists(tmp_path / "spool") or os.listdir(tmp_path / "spool") == []
+
+
+def test_spools_and_replays_when_unavailable(tmp_path):
+    spool_dir = tmp_path / "spool"
+
+    async def scenario(stub):
+        exporter = RemoteWriteExporter(stub.url, batch_size=1000, flush_interval=60,
+                                       spool_dir=str(spool_dir), retries=1)
+        exporter.push(record("111", 50.0), 1700000000000)
+        await exporter.flush()
+        assert len(os.listdir(spool_dir)) == 1
+
+        exporter.push(record("111", 50.1), 1700000002000)
+        await exporter.flush()
+        await exporter.close()
+
+    with StubImportServer(statuses=[500]) as stub:
+        asyncio.run(scenario(stub))
+
+    assert os.listdir(spool_dir) == []
+    bodies = [body for _, body in stub.requests]
+    # Неудачная попытка, новая пачка, затем досылка сохранённой
+    assert len(bodies) == 3
+    assert "1700000000000" in bodies[0] and bodies[0] == bodies[2]
+    assert "1700000002000" in bodies[1]
+
+
+def test_rejects_unsupported_url():
+    with pytest.raises(ValueError):
+        RemoteWriteExporter("ftp://example.com/import")
+
+
+def test_close_during_retry_spools_batch(tmp_path):
+    spool_dir = tmp_path / "spool"
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead_port = sock.getsockname()[1]
+
+    async def scenario():
+        exporter = RemoteWriteExporter(f"http://127.0.0.1:{dead_port}/api/v1/import/prometheus",
+                                       batch_size=1, flush_interval=60, spool_dir=str(spool_dir), retries=2)
+        exporter.push(record("111", 50.0), 1700000000000)
+        # Фоновая отправка уже ждёт паузы между попытками
+        await asyncio.sleep(0.2)
+        await exporter.close()
+
+    asyncio.run(scenario())
+
+    files = os.listdir(spool_dir)
+    assert len(files) == 1
+    with open(spool_dir / files[0], "rb") as f:
+        assert "1700000000000" in gzip.decompress(f.read()).decode("utf-8")
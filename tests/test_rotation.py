@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from src.infrastructure import rotation
+from src.infrastructure.rotation import (
+    INDEX_SUFFIX, RotatingJsonlWriter, compress_segment, iter_records, load_indexes,
+)
+
+
+def record(day, hour, imei, n=0):
+    return {"_received_at": f"2026-01-{day:02d}T{hour:02d}:00:00", "imei": imei, "n": n}
+
+
+def write_segment(directory, stamp, records):
+    path = os.path.join(directory, f"data.{stamp}.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for item in records:
+            f.write(json.dumps(item) + "\n")
+    return path
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("data.") and not name.endswith(INDEX_SUFFIX))
+
+
+@pytest.fixture
+def no_zstd(monkeypatch):
+    monkeypatch.setattr(rotation, "zstandard", None)
+
+
+def test_rotates_by_size(tmp_path, no_zstd):
+    path = str(tmp_path / "data.jsonl")
+
+    async def scenario():
+        writer = RotatingJsonlWriter(path, max_bytes=200, max_age=0, index_every=2)
+        for n in range(20):
+            await writer.write(record(1, n % 24, "A", n))
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    segments = segment_files(tmp_path)
+    assert len(segments) > 1
+    # Активный файл остаётся под исходным именем, закрытые сегменты сжаты
+    assert "data.jsonl" in segments
+    assert all(name.endswith(".jsonl.gz") for name in segments if name != "data.jsonl")
+    assert os.path.getsize(path) < 200 + 100
+
+    indexes = load_indexes(path)
+    assert len(indexes) == len(segments) - 1
+    assert all(index["records"] > 0 and index["devices"] == ["A"] for index in indexes)
+    assert [item["n"] for item in iter_records(path)] == list(range(20))
+
+
+def test_rotates_by_age(tmp_path, monkeypatch, no_zstd):
+    clock = {"now": 1000.0}
+
+    class FakeTime:
+        @staticmethod
+        def monotonic():
+            return clock["now"]
+
+    monkeypatch.setattr(rotation, "time", FakeTime)
+    path = str(tmp_path / "data.jsonl")
+
+    async def scenario():
+        writer = RotatingJsonlWriter(path, max_bytes=0, max_age=60)
+        await writer.write(record(1, 0, "A", 0))
+        clock["now"] += 30
+        await writer.write(record(1, 1, "A", 1))
+        assert load_indexes(path) == [] and len(segment_files(tmp_path)) == 1
+        clock["now"] += 31
+        await writer.write(record(1, 2, "A", 2))
+        await writer.close()
+
+    asyncio.run(scenario())
+
+    indexes = load_indexes(path)
+    assert len(indexes) == 1
+    assert indexes[0]["records"] == 2
+    assert [item["n"] for item in iter_records(path)] == [0, 1, 2]
+
+
+def test_zstd_falls_back_to_gzip(tmp_path, no_zstd):
+    segment = write_segment(str(tmp_path), "20260101T000000000000", [record(1, 0, "A")])
+    target = compress_segment(segment, "zstd", index_every=10)
+
+    assert target.endswith(".gz")
+    with open(target + INDEX_SUFFIX, encoding="utf-8") as f:
+        assert json.load(f)["compression"] == "gz"
+    assert list(iter_records(str(tmp_path / "data.jsonl"))) == [record(1, 0, "A")]
+
+
+def test_zstd_when_available(tmp_path):
+    pytest.importorskip("zstandard")
+    segment = write_segment(str(tmp_path), "20260101T000000000000", [record(1, h, "A", h) for h in range(5)])
+    target = compress_segment(segment, "zstd", index_every=2)
+
+    assert target.endswith(".zst")
+    assert [item["n"] for item in iter_records(str(tmp_path / "data.jsonl"), since="2026-01-01T03:00:00")] == [3, 4]
+
+
+@pytest.fixture
+def indexed_segments(tmp_path, monkeypatch, no_zstd):
+    """Три сегмента по дням: 1-е и 2-е января - устройство A, 3-е - B."""
+    directory = str(tmp_path)
+    for day, imei in ((1, "A"), (2, "A"), (3, "B")):
+        segment = write_segment(directory, f"202601{day:02d}T000000000000",
+                                [record(day, hour, imei, day * 100 + hour) for hour in range(6)])
+        compress_segment(segment, "gzip", index_every=2)
+
+    opened = []
+    open_segment = rotation._open_segment
+
+    def spy(index, compressed_offset):
+        opened.append((index["segment"], compressed_offset))
+        return open_segment(index, compressed_offset)
+
+    monkeypatch.setattr(rotation, "_open_segment", spy)
+    return str(tmp_path / "data.jsonl"), opened
+
+
+def test_index_skips_segments_outside_interval(indexed_segments):
+    path, opened = indexed_segments
+
+    result = list(iter_records(path, since="2026-01-02T00:00:00", until="2026-01-02T23:59:59"))
+
+    assert [item["n"] for item in result] == [200 + hour for hour in range(6)]
+    assert [name for name, _ in opened] == ["data.20260102T000000000000.jsonl.gz"]
+
+
+def test_index_seeks_to_block_before_since(indexed_segments):
+    path, opened = indexed_segments
+
+    result = list(iter_records(path, since="2026-01-03T04:00:00"))
+
+    assert [item["n"] for item in result] == [304, 305]
+    name, offset = opened[-1]
+    assert opened == [(name, offset)]
+    assert name == "data.20260103T000000000000.jsonl.gz"
+    # Блоки по 2 записи: чтение начинается с третьего блока, а не с начала файла
+    assert offset > 0
+
+
+def test_index_skips_segments_without_device(indexed_segments):
+    path, opened = indexed_segments
+
+    result = list(iter_records(path, imei="B"))
+
+    assert [item["n"] for item in result] == [300 + hour for hour in range(6)]
+    assert [name for name, _ in opened] == ["data.20260103T000000000000.jsonl.gz"]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+from src.domain.decoders import TagDecoder
+from src.infrastructure.storage import JsonFileStorage
+
+
+class RecordingExporter:
+    REQUIRED_FIELDS = frozenset()
+
+    def __init__(self):
+        self.pushed = []
+
+    def push(self, samples, timestamp_ms):
+        self.pushed.append((list(samples), timestamp_ms))
+
+    async def close(self):
+        pass
+
+
+def mercury_packet(imei):
+    mercury = TagDecoder.decode(0xEA, [0x02, 0x63] + [0x11] * 91)
+    return {
+        "source_ip": "127.0.0.1",
+        "source_port": 40000,
+        "imei": imei,
+        "tags": {"0x20": 1700000000, "0x21": 250, "0x50": 12000, "0xEA": mercury},
+    }
+
+
+def test_save_uses_session_imei(tmp_path):
+    path = tmp_path / "parsed.jsonl"
+    exporter = RecordingExporter()
+
+    async def scenario():
+        storage = JsonFileStorage(str(path), exporter=exporter)
+        await storage.save(mercury_packet("860000000000001"))
+        await storage.save(mercury_packet("860000000000002"))
+        await storage.close()
+
+    asyncio.run(scenario())
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [record["imei"] for record in records] == ["860000000000001", "860000000000002"]
+    assert records[0]["mercury_id"] == "99"
+
+    samples, timestamp_ms = exporter.pushed[1]
+    assert timestamp_ms == 1700000000250
+    assert {labels["imei"] for _, labels, _ in samples} == {"860000000000002"}
+    assert ("galileosky_enter_voltage", {"imei": "860000000000002", "mercury_id": "99", "input_id": "0"}, 12000.0) in samples
+
+
+def test_save_rejected_keeps_raw_packet(tmp_path):
+    path = tmp_path / "parsed.jsonl"
+
+    async def scenario():
+        storage = JsonFileStorage(str(path))
+        await storage.save_rejected({"error": "Packet parsed partially: skipped_bytes", "imei": "860000000000001",
+                                     "raw_data": "0105000102030405"})
+        await storage.close()
+
+    asyncio.run(scenario())
+
+    errors = [json.loads(line) for line in (tmp_path / "parsed_errors.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert len(errors) == 1
+    assert errors[0]["raw_data"] == "0105000102030405"
+    assert errors[0]["imei"] == "860000000000001"
+    assert "_received_at" in errors[0]
+    assert not path.exists() or path.read_text(encoding="utf-8") == ""
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+from src.domain.decoders import TagDecoder
+from src.domain.tags import DEFAULT_SCHEMA_PATH, Tags, compile_tag_entries
+
+
+def test_decoder_kinds_come_from_registry():
+    assert Tags.DECODER_KINDS == TagDecoder.KINDS
+    assert set(TagDecoder._DECODERS) <= Tags.DECODER_KINDS
+    assert {"struct", "mercury", "extended"} <= Tags.DECODER_KINDS
+
+
+def test_schema_with_unknown_decoder_is_rejected(tmp_path):
+    with open(DEFAULT_SCHEMA_PATH, encoding="utf-8") as f:
+        schema = json.load(f)
+    schema["tags"].append({"num": "0xFD", "length": 1, "decoder": "no_such_decoder"})
+    path = tmp_path / "schema.json"
+    path.write_text(json.dumps(schema), encoding="utf-8")
+
+    tags_before = Tags.ALL_TAGS
+    with pytest.raises(ValueError, match="no_such_decoder"):
+        Tags.load(str(path))
+    # Неудачная загрузка не портит текущую таблицу
+    assert Tags.ALL_TAGS is tags_before
+
+
+def test_fields_require_format():
+    with pytest.raises(ValueError, match="without format"):
+        compile_tag_entries([{"num": "0x50", "length": 2, "fields": ["a", "b"]}])
+
+
+def test_fields_must_match_format():
+    with pytest.raises(ValueError, match="do not match"):
+        compile_tag_entries([{"num": "0x50", "length": 2, "format": "<H", "fields": ["a", "b"]}])
+    tags = compile_tag_entries([{"num": "0x50", "length": 2, "format": "<BB", "fields": ["a", "b"]}])
+    assert tags[0x50].fields == ("a", "b")